@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -47,8 +49,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Đo truy vấn SQL của từng request khi bật SQL_PROFILING (ticket_movie/sql_profiler.py)
+    'ticket_movie.sql_profiler.SQLProfilerMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Ghim user vừa ghi DB về primary để không đọc dữ liệu cũ từ replica
+    'ticket_movie.db_router.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,17 +85,99 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'MTBS',
-        'USER': 'tridm',
-        'PASSWORD': 'tridm',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'MTBS'),
+        'USER': os.environ.get('DB_USER', 'tridm'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'tridm'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Giữ kết nối giữa các request (giây, 0 = đóng sau mỗi request) và kiểm tra
+        # kết nối còn sống trước khi dùng lại. Mặc định 0: server chạy ASGI với các request
+        # SSE sống lâu, Django khuyên không giữ kết nối dưới ASGI; dùng DB_POOL thay thế
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
     }
 }
 
+# DB_POOL=true: dùng pool kết nối trong tiến trình của psycopg 3 (psycopg[binary,pool] trong requirements).
+# Pool tự quản lý vòng đời kết nối nên CONN_MAX_AGE phải là 0
+if os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'yes'):
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            # Số giây chờ lấy kết nối khi pool đã dùng hết
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            # Kết nối lấy ra khỏi pool được kiểm tra bằng 1 câu lệnh rỗng trước khi dùng
+            'check': ConnectionPool.check_connection,
+        },
+    }
+
+# Replica chỉ đọc cho các API đọc công khai: DB_REPLICAS="host[:port][/name],..." (cùng user/mật
+# khẩu với default). Thử trên máy local bằng 2 database, ví dụ DB_REPLICAS="localhost/MTBS_replica".
+# Cần cache dùng chung (REDIS_URL) để mọi worker thấy cùng thông tin ghim về primary
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, map(str.strip, os.environ.get('DB_REPLICAS', '').split(',')))):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'OPTIONS': copy.deepcopy(DATABASES['default'].get('OPTIONS', {})),
+        # Khi chạy test, replica dùng chung database test của default
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['ticket_movie.db_router.ReplicaRouter']
+
+# Số giây user/dữ liệu vừa ghi chỉ đọc từ primary. Phải lớn hơn độ trễ replication lớn nhất:
+# replica trễ hơn thì cache danh mục/sơ đồ ghế có thể nạp lại dữ liệu cũ từ replica
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '30'))
+
+# SQL_PROFILING=true: trả về số truy vấn, thời gian DB và số dạng SQL bị lặp (N+1) của mỗi request
+# qua header X-DB-* / Server-Timing và log ticket_movie.sql_profiler
+SQL_PROFILING = os.environ.get('SQL_PROFILING', '').lower() in ('1', 'true', 'yes')
+# Cùng 1 dạng SQL chạy từ bấy nhiêu lần trong 1 request thì bị coi là truy vấn lặp
+SQL_PROFILING_REPEAT_THRESHOLD = 3
+# File ghi profile SQL (mỗi request 1 dòng JSON), để trống thì ghi ra stderr
+SQL_PROFILING_LOG_FILE = os.environ.get('SQL_PROFILING_LOG_FILE', '')
+
+# Logging mặc định của Django bỏ qua log INFO của app, nên khai báo riêng logger của profiler
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'sql_profile': {'()': 'ticket_movie.sql_profiler.ProfileFormatter'},
+    },
+    'handlers': {
+        'sql_profile': {
+            'class': 'logging.FileHandler',
+            'filename': SQL_PROFILING_LOG_FILE,
+            'formatter': 'sql_profile',
+        } if SQL_PROFILING_LOG_FILE else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'sql_profile',
+        },
+    },
+    'loggers': {
+        'ticket_movie.sql_profiler': {
+            'handlers': ['sql_profile'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication có cache user trong tiến trình (ticket_movie/authentication.py)
+        'ticket_movie.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -117,6 +205,82 @@ SIMPLE_JWT = {
     # Thiết lập loại token
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
+
+# Cache dùng chung cho mọi worker: REDIS_URL=redis://localhost:6379/0. Không đặt thì dùng
+# LocMemCache riêng của từng tiến trình, chỉ đúng khi chạy 1 tiến trình (runserver)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Thời gian giữ ghế của booking PENDING trước khi bị chuyển sang EXPIRED
+BOOKING_HOLD_TTL = timedelta(minutes=15)
+# Số booking hết hạn xử lý mỗi lượt của lệnh expire_bookings
+BOOKING_EXPIRY_BATCH_SIZE = 500
+# Sơ đồ ghế của phòng chiếu được cache theo Screen.layout_version, tăng mỗi khi ghế thay đổi
+SEAT_LAYOUT_CACHE_TIMEOUT = 60 * 60 * 24
+# Broker đẩy thay đổi ghế realtime: PostgresBroker (nhiều worker và lệnh expire_bookings)
+# hoặc LocalBroker (chỉ trong 1 tiến trình, dùng khi test)
+SEAT_EVENTS_BROKER = 'ticket_movie.live.PostgresBroker'
+# Mỗi luồng SSE tự đóng sau số giây này, EventSource tự kết nối lại; giới hạn thời gian
+# 1 kết nối giữ tài nguyên server kể cả khi client đã mất mạng mà server chưa biết
+SEAT_EVENTS_MAX_STREAM_SECONDS = 5 * 60
+# Số bản dịch (.po đã biên dịch) giữ trong bộ nhớ cho TranslateView
+TRANSLATION_CACHE_SIZE = 16
+# Cache response API danh mục (MainView...), tự làm mới khi admin sửa dữ liệu
+CATALOG_CACHE_TIMEOUT = 60 * 60
+# Lịch chiếu phụ thuộc thời điểm hiện tại nên cache ngắn hơn
+SCHEDULE_CACHE_TIMEOUT = 60
+# Chỉ mục promotion trong bộ nhớ được dựng lại tối đa sau số giây này
+PROMOTION_INDEX_TTL = 60
+# Nhập lịch chiếu hàng loạt: số dòng mỗi lần bulk_create và số dòng lỗi tối đa trả về qua API
+SHOWTIME_IMPORT_CHUNK_SIZE = 1000
+SHOWTIME_IMPORT_MAX_ERRORS = 1000
+# Thời gian dọn phòng tối thiểu giữa 2 suất chiếu liên tiếp của cùng phòng chiếu
+SHOWTIME_CLEANING_BUFFER = timedelta(minutes=15)
+# Cache user cho JWT: thời gian sống (giây) và số user tối đa giữ trong mỗi tiến trình
+AUTH_USER_CACHE_TTL = 30
+AUTH_USER_CACHE_SIZE = 10000
+# Bloom filter jti bị blacklist: số giây giữa 2 lần nạp token mới, khoảng đọc lùi mỗi lần nạp,
+# số giây giữa 2 lần dựng lại toàn bộ và số jti dự kiến (tỉ lệ dương tính giả ~1%)
+TOKEN_BLACKLIST_SYNC_INTERVAL = 1
+TOKEN_BLACKLIST_SYNC_OVERLAP = timedelta(seconds=5)
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 60 * 60
+TOKEN_BLACKLIST_FILTER_CAPACITY = 1_000_000
+# Số token hết hạn xoá mỗi batch của lệnh prune_tokens
+TOKEN_PRUNE_BATCH_SIZE = 1000
+# API lấy thông tin user của các provider social login (đổi sang server giả lập khi test)
+SOCIAL_AUTH_PROVIDERS = {
+    'google': {'userinfo_url': 'https://www.googleapis.com/oauth2/v3/userinfo'},
+    'facebook': {'userinfo_url': 'https://graph.facebook.com/me'},
+}
+# Timeout (kết nối, đọc) tính bằng giây và số kết nối keep-alive tối đa mỗi provider
+SOCIAL_AUTH_TIMEOUT = (3.05, 5)
+SOCIAL_AUTH_POOL_SIZE = 10
+# Số giây cache profile của 1 access token đã xác thực
+SOCIAL_PROFILE_CACHE_TIMEOUT = 5 * 60
+
+# Hasher đầu tiên dùng cho mật khẩu mới; hash theo hasher/chi phí cũ được nâng cấp khi đăng nhập.
+# Đổi thứ tự để chuyển dần sang scrypt, chỉnh chi phí theo lệnh benchmark_password_hashers
+PASSWORD_HASHERS = [
+    'ticket_movie.hashers.TunedPBKDF2PasswordHasher',
+    'ticket_movie.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = 1_000_000
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,101 @@
+"""
+Bản async của các API đọc công khai, dùng async ORM của Django.
+
+Chỉ có lợi khi chạy qua ASGI (backend/asgi.py): truy vấn chậm không giữ cả
+worker như WSGI. Kết quả giống hệt view sync cùng tên trong views.py và dùng
+chung cache; so sánh 2 bản bằng lệnh benchmark_endpoints.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
+
+from ticket_movie.app.views import MainView, MoviesSchedule
+from ticket_movie.catalog_cache import PIN_SCOPE, acached_json_response
+from ticket_movie.db_router import aread_from_replica
+from ticket_movie.i18n import get_catalog
+from ticket_movie.seat_layout import arender_seat_map
+
+
+def parse_body(request):
+    """Dữ liệu POST dạng JSON hoặc form, giống request.data của DRF"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+class AsyncTranslateView(View):
+    async def get(self, request):
+        lang = request.GET.get("lang")
+        if not lang:
+            return JsonResponse({"error": "Missing 'lang' query parameter"}, status=400)
+
+        # Bản dịch nằm trong LRU của tiến trình nhưng get_catalog vẫn stat() file (và đọc
+        # bằng polib khi file đổi) nên chạy trong thread để không chặn event loop
+        catalog = await sync_to_async(get_catalog)(lang)
+        if catalog is None:
+            return JsonResponse({"error": "Translation file not found"}, status=404)
+
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if catalog.etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(catalog.content, content_type='application/json')
+        response['ETag'] = catalog.etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class AsyncMainView(View):
+    async def get(self, request):
+        return await acached_json_response('main', {}, self.build_data)
+
+    async def build_data(self):
+        async with aread_from_replica(PIN_SCOPE):
+            return MainView.serialize(
+                [movie async for movie in MainView.movies.all()],
+                [city async for city in MainView.cities.all()],
+                [cinema async for cinema in MainView.cinemas.all()],
+            )
+
+
+# API công khai, không dùng session nên không cần CSRF (giống APIView của DRF)
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncMoviesSchedule(View):
+    async def post(self, request):
+        try:
+            cinema_id, day = MoviesSchedule.parse_params(parse_body(request))
+        except (TypeError, ValueError) as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        async def build():
+            showtimes = MoviesSchedule.schedule_queryset(cinema_id, day)
+            async with aread_from_replica(PIN_SCOPE):
+                showtimes = [showtime async for showtime in showtimes]
+            return MoviesSchedule.group_showtimes(showtimes)
+
+        return await acached_json_response(
+            'schedule', {'cinema_id': cinema_id, 'day': day}, build,
+            timeout=settings.SCHEDULE_CACHE_TIMEOUT)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSeatsScreen(View):
+    async def post(self, request):
+        try:
+            data = parse_body(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        screen_id = data.get("screen_id", 1)
+        showtime_id = data.get("showtime_id", 1)
+        return json_response(await arender_seat_map(screen_id, showtime_id))
@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogPagination(CursorPagination):
+    """
+    Phân trang theo cursor trên id: không cần COUNT(*) và OFFSET,
+    trang sau luôn đi thẳng theo index khoá chính.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = ordering
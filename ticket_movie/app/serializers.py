@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from ticket_movie.models import Cinema, City, Movie, Screen, Showtime
+from ticket_movie.booking import count_available_seats
+from ticket_movie.models import Cinema, City, Movie, Screen, Seat, Showtime
+from ticket_movie.seat_layout import apply_seat_plan, build_seat_plan
+from ticket_movie.showtime_overlap import find_overlap, is_overlap_violation
+from django.db import IntegrityError, transaction
 from datetime import date, datetime
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
@@ -62,7 +66,7 @@ class CitiesSerializer(serializers.ModelSerializer):
 class CinemaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cinema
-        fields = '_all_'
+        fields = '__all__'
         extra_kwargs = {
             'name': {'required': True},
             'address': {'required': True},
@@ -87,13 +91,17 @@ class CinemaSerializer(serializers.ModelSerializer):
 
 
 class ScreenSerializer(serializers.ModelSerializer):
+    # Sơ đồ ghế gọn (xem seat_layout.build_seat_plan); có layout thì capacity tính theo số ghế.
+    # Phòng đã có ghế thì capacity luôn bằng số ghế đang hoạt động, không sửa tay được
+    layout = serializers.JSONField(write_only=True, required=False)
+
     class Meta:
         model = Screen
-        fields = '_all_'
+        exclude = ('layout_version',)
         extra_kwargs = {
             'name': {'required': True},
             'type': {'required': True},
-            'capacity': {'required': True}
+            'capacity': {'required': False}
         }
 
     def validate_type(self, value):
@@ -108,25 +116,64 @@ class ScreenSerializer(serializers.ModelSerializer):
                 "Please enter cinema capacity number with at least 1 digits.")
         return value
 
+    def validate_layout(self, value):
+        try:
+            return build_seat_plan(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, data):
+        if self.instance is None and 'capacity' not in data and 'layout' not in data:
+            raise serializers.ValidationError(
+                {'capacity': 'Please enter cinema capacity or a seat layout.'})
+        if 'layout' in data:
+            data['capacity'] = len(data['layout'])
+        elif (self.instance is not None
+              and data.get('capacity', self.instance.capacity) != self.instance.capacity
+              and Seat.objects.filter(screen=self.instance).exists()):
+            raise serializers.ValidationError({
+                'capacity': 'Capacity is computed from the seats of this screen, '
+                            'send a seat layout instead.'})
+        return data
+
+    def create(self, validated_data):
+        plan = validated_data.pop('layout', None)
+        with transaction.atomic():
+            screen = super().create(validated_data)
+            if plan is not None:
+                apply_seat_plan(screen, plan)
+        return screen
+
+    def update(self, instance, validated_data):
+        plan = validated_data.pop('layout', None)
+        with transaction.atomic():
+            screen = super().update(instance, validated_data)
+            if plan is not None:
+                apply_seat_plan(screen, plan)
+        return screen
+
 
 class ShowtimeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Showtime
-        fields = '_all_'
+        fields = '__all__'
         extra_kwargs = {
             'start_time': {'required': True},
             'end_time': {'required': True},
             'base_price': {'required': True},
-            'available_seats': {'required': True},
+            # Do hệ thống tự tính từ sơ đồ ghế và booking, không nhập tay
+            'available_seats': {'read_only': True},
             'status': {'required': True},
             'movie': {'required': True},
             'screen': {'required': True}
         }
 
     def validate(self, data):
+        # Cập nhật 1 phần thì các trường không gửi lên lấy theo suất chiếu hiện tại
+        current = lambda field: data.get(field, getattr(self.instance, field, None))
         try:
-            start_time = data.get("start_time")
-            end_time = data.get("end_time")
+            start_time = current("start_time")
+            end_time = current("end_time")
 
             if isinstance(start_time, str):
                 start_time = datetime.fromisoformat(start_time)
@@ -134,11 +181,43 @@ class ShowtimeSerializer(serializers.ModelSerializer):
             if isinstance(end_time, str):
                 end_time = datetime.fromisoformat(end_time)
 
-            if start_time >= end_time:
-                raise serializers.ValidationError(
-                    "End time must be after start time.")
+            invalid_range = start_time >= end_time
         except Exception:
             raise serializers.ValidationError(
                 "Invalid date format. Use ISO format: YYYY-MM-DDTHH:MM:SS±HH:MM")
+        if invalid_range:
+            raise serializers.ValidationError(
+                "End time must be after start time.")
+
+        screen = current("screen")
+        if screen is not None and current("status") != Showtime.ShowStatus.CANCELLED:
+            conflict = find_overlap(screen.id, start_time, end_time,
+                                    exclude_id=getattr(self.instance, 'id', None))
+            if conflict is not None:
+                raise serializers.ValidationError(
+                    f"Showtime overlaps showtime {conflict.id} "
+                    f"({conflict.start_time.isoformat()} - {conflict.end_time.isoformat()}) "
+                    "on this screen, including the cleaning time between shows.")
 
         return data
+
+    def create(self, validated_data):
+        validated_data['available_seats'] = count_available_seats(validated_data['screen'].id)
+        return self.save_guarded(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        screen = validated_data.get('screen')
+        if screen is not None and screen.id != instance.screen_id:
+            validated_data['available_seats'] = count_available_seats(screen.id, instance.id)
+        return self.save_guarded(super().update, instance, validated_data)
+
+    def save_guarded(self, save, *args):
+        # Hai request cùng lúc có thể cùng qua validate; ràng buộc exclusion chặn request sau
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError as e:
+            if not is_overlap_violation(e):
+                raise
+            raise serializers.ValidationError(
+                "Showtime overlaps another showtime on this screen.")
@@ -1,10 +1,26 @@
 from django.urls import path
-from .views import MainView, MoviesSchedule, SeatsScreen, SeatsScreenBooking, TranslateView
+from .async_views import AsyncMainView, AsyncMoviesSchedule, AsyncSeatsScreen, AsyncTranslateView
+from .views import (
+    BestPromotionView, BookingCancelView, CinemaListView, CityListView, MainView, MovieListView, MoviesSchedule, ScheduleRangeView,
+    SeatsScreen, SeatsScreenBooking, SeatsScreenEvents, TranslateView
+)
 
 urlpatterns = [
     path('translate/', TranslateView.as_view(), name='translate'),
     path('main/data/', MainView.as_view(), name='get_data'),
+    path('main/movies/', MovieListView.as_view(), name='movie_list'),
+    path('main/cinemas/', CinemaListView.as_view(), name='cinema_list'),
+    path('main/cities/', CityListView.as_view(), name='city_list'),
     path('main/movies/schedule/', MoviesSchedule.as_view(), name='movie_schedule'),
+    path('main/schedule/', ScheduleRangeView.as_view(), name='schedule_range'),
     path('main/screen/seat/', SeatsScreen.as_view(), name='screen_seat'),
     path('main/screen/seat/booking/', SeatsScreenBooking.as_view(), name='screen_seat_booking'),
+    path('main/booking/cancel/', BookingCancelView.as_view(), name='booking_cancel'),
+    path('main/promotions/best/', BestPromotionView.as_view(), name='best_promotion'),
+    path('main/screen/seat/events/<int:showtime_id>/', SeatsScreenEvents.as_view(), name='screen_seat_events'),
+    # Bản async của các API đọc công khai, dùng khi chạy qua ASGI
+    path('async/translate/', AsyncTranslateView.as_view(), name='async_translate'),
+    path('async/main/data/', AsyncMainView.as_view(), name='async_get_data'),
+    path('async/main/movies/schedule/', AsyncMoviesSchedule.as_view(), name='async_movie_schedule'),
+    path('async/main/screen/seat/', AsyncSeatsScreen.as_view(), name='async_screen_seat'),
 ]
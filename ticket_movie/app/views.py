@@ -1,31 +1,50 @@
-from datetime import datetime
-from decimal import Decimal
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAdminUser
-import os, polib
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from ticket_movie.app.pagination import CatalogPagination
 from ticket_movie.app.serializers import CinemaSerializer, CitiesSerializer, MovieSerializer
-from ticket_movie.models import Booking, BookingSeat, Cinema, City, Movie, Seat, Showtime, User
-from django.db.models import Max, Count
-from django.utils.crypto import get_random_string
+from ticket_movie.booking import (
+    BookingError, BookingNotFoundError, SeatConflictError, SoldOutError, cancel_booking, create_booking,
+    quote_order
+)
+from ticket_movie.catalog_cache import PIN_SCOPE, cached_json_response
+from ticket_movie.db_router import read_from_replica
+from ticket_movie.i18n import get_catalog
+from ticket_movie.live import seat_event_stream
+from ticket_movie.models import Cinema, City, Movie, Showtime, User
+from ticket_movie.promotion_index import best_promotions, promotion_breakdown
+from ticket_movie.promotions import PromotionError
+from ticket_movie.schedule import schedule_json
+from ticket_movie.seat_layout import render_seat_map
 from django.db import transaction
 class TranslateView(APIView):
     def get(self, request):
         try:
-            TRANSLATION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'translations'))
             lang = request.query_params.get("lang")
             if not lang:
                 return Response({"error": "Missing 'lang' query parameter"}, status=status.HTTP_400_BAD_REQUEST)
 
-            filepath = os.path.join(TRANSLATION_DIR, f"{lang}.po")
-            if not os.path.exists(filepath):
+            catalog = get_catalog(lang)
+            if catalog is None:
                 return Response({"error": "Translation file not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            po = polib.pofile(filepath)
-            translations = {entry.msgid: entry.msgstr for entry in po if entry.msgstr}
-            return Response(translations)
+            # Client gửi lại ETag cũ thì chỉ cần trả 304, không gửi lại cả bản dịch
+            etags = parse_etags(request.headers.get('If-None-Match', ''))
+            if catalog.etag in etags or '*' in etags:
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(catalog.content, content_type='application/json')
+            response['ETag'] = catalog.etag
+            response['Cache-Control'] = 'no-cache'
+            return response
         except Exception as e:
             return Response({
                 'success': False,
@@ -35,36 +54,178 @@ class TranslateView(APIView):
 class MainView(APIView):
     
     def get(self, request):
-        movies = Movie.objects.all().order_by('-id')
+        return cached_json_response('main', {}, self.build_data)
+
+    movies = Movie.objects.all().order_by('-id')
+    cities = City.objects.all().order_by('id')
+    cinemas = Cinema.objects.all().order_by('id')
+
+    def build_data(self):
+        with read_from_replica(PIN_SCOPE):
+            return self.serialize(self.movies.all(), self.cities.all(), self.cinemas.all())
+
+    @staticmethod
+    def serialize(movies, cities, cinemas):
         serializer = MovieSerializer(movies, many=True)
-        
-        cities = City.objects.all().order_by('id')
         cities_serializer = CitiesSerializer(cities, many=True)
-        cinemas = Cinema.objects.all().order_by('id')
         cinemas_serializer = CinemaSerializer(cinemas, many=True)
-        return Response({ 
-                            "movies": serializer.data , 
-                            "cities": cities_serializer.data,
-                            "cinemas": cinemas_serializer.data,
-                        })
+        return { 
+                    "movies": serializer.data , 
+                    "cities": cities_serializer.data,
+                    "cinemas": cinemas_serializer.data,
+                }
         
+class CatalogListView(APIView):
+    """
+    Danh sách có phân trang, lọc và chọn trường (?fields=id,title).
+    Chỉ SELECT đúng các cột được yêu cầu qua values().
+    """
+    queryset = None
+    allowed_fields = ()
+    default_fields = ()
+    ordering = '-id'
+
+    def get_fields(self, request):
+        fields = request.query_params.get('fields')
+        if not fields:
+            return list(self.default_fields)
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        invalid = [field for field in fields if field not in self.allowed_fields]
+        if invalid:
+            raise ValueError(f"Unknown fields: {', '.join(invalid)}")
+        # Cursor phân trang theo id nên luôn cần cột id
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return fields
+
+    def filter_queryset(self, request, queryset):
+        return queryset
+
+    def get(self, request):
+        try:
+            fields = self.get_fields(request)
+            queryset = self.filter_queryset(request, self.queryset.all())
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def build():
+            paginator = CatalogPagination(self.ordering)
+            page = paginator.paginate_queryset(queryset.values(*fields), request, view=self)
+            return paginator.get_paginated_response(page).data
+
+        return cached_json_response(
+            self.__class__.__name__, request.build_absolute_uri(), build,
+            timeout=settings.SCHEDULE_CACHE_TIMEOUT)
+
+
+def parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"'{name}' must use the YYYY-MM-DD format")
+
+
+def parse_id_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"'{name}' must be an id")
+    return int(value)
+
+
+class MovieListView(CatalogListView):
+    queryset = Movie.objects.all()
+    allowed_fields = tuple(MovieSerializer.Meta.fields)
+    # Mặc định bỏ description, movie_cast (TextField nặng nhất)
+    default_fields = ('id', 'title', 'duration', 'release_date', 'genre', 'director',
+                      'poster_url', 'trailer_url', 'rating', 'status')
+
+    def filter_queryset(self, request, queryset):
+        statuses = request.query_params.get('status')
+        if statuses:
+            statuses = statuses.split(',')
+            invalid = [value for value in statuses if value not in Movie.Status.values]
+            if invalid:
+                raise ValueError(f"Unknown status: {', '.join(invalid)}")
+            queryset = queryset.filter(status__in=statuses)
+
+        release_from = parse_date_param(request, 'release_from')
+        if release_from:
+            queryset = queryset.filter(release_date__gte=release_from)
+        release_to = parse_date_param(request, 'release_to')
+        if release_to:
+            queryset = queryset.filter(release_date__lte=release_to)
+
+        # Phim đang có suất chiếu tại thành phố
+        city_id = parse_id_param(request, 'city')
+        if city_id:
+            queryset = queryset.filter(id__in=Showtime.objects.filter(
+                screen__cinema__city_id=city_id,
+                status=Showtime.ShowStatus.SCHEDULED,
+                start_time__gt=timezone.now(),
+            ).values('movie_id'))
+        return queryset
+
+
+class CinemaListView(CatalogListView):
+    queryset = Cinema.objects.all()
+    allowed_fields = ('id', 'city', 'name', 'address', 'phone', 'opening_hours')
+    default_fields = ('id', 'city', 'name', 'address')
+    ordering = 'id'
+
+    def filter_queryset(self, request, queryset):
+        city_id = parse_id_param(request, 'city')
+        if city_id:
+            queryset = queryset.filter(city_id=city_id)
+        return queryset
+
+
+class CityListView(CatalogListView):
+    queryset = City.objects.all()
+    allowed_fields = tuple(CitiesSerializer.Meta.fields)
+    default_fields = allowed_fields
+    ordering = 'id'
+
 class MoviesSchedule(APIView):
     def post(self, request):
-        cinema_id = request.data.get("cinema_id", 1)
-        day_str = request.data.get("day")
-        if day_str:
-            day = datetime.strptime(day_str, '%Y-%m-%d').date()
+        cinema_id, day = self.parse_params(request.data)
+
+        # Lịch chiếu lọc theo thời điểm hiện tại nên chỉ cache trong thời gian ngắn
+        return cached_json_response(
+            'schedule', {'cinema_id': cinema_id, 'day': day},
+            lambda: self.build_schedule(cinema_id, day),
+            timeout=settings.SCHEDULE_CACHE_TIMEOUT)
 
+    @staticmethod
+    def parse_params(data):
+        cinema_id = data.get("cinema_id", 1)
+        day_str = data.get("day")
+        # Không gửi ngày thì lấy lịch hôm nay
+        day = datetime.strptime(day_str, '%Y-%m-%d').date() if day_str else timezone.localdate()
+        return cinema_id, day
+
+    @staticmethod
+    def schedule_queryset(cinema_id, day):
         start_datetime = timezone.make_aware(datetime.combine(day, datetime.min.time()))
         end_datetime = timezone.make_aware(datetime.combine(day, datetime.max.time()))
 
-        showtimes = Showtime.objects.select_related('movie', 'screen') \
+        return Showtime.objects.select_related('movie', 'screen') \
             .filter(status='scheduled', screen__cinema_id=cinema_id
                     , start_time__gt=timezone.now()
                     , start_time__gte=start_datetime
                     , start_time__lte=end_datetime) \
             .order_by('movie_id', 'screen_id', 'start_time')
 
+    def build_schedule(self, cinema_id, day):
+        with read_from_replica(PIN_SCOPE):
+            return self.group_showtimes(self.schedule_queryset(cinema_id, day))
+
+    @staticmethod
+    def group_showtimes(showtimes):
         movies = {}
         for st in showtimes:
             movie_id = str(st.movie.id)
@@ -110,103 +271,84 @@ class MoviesSchedule(APIView):
 
         result.sort(key=lambda x: x["movie"]["release_date"])
 
-        return Response(result)
+        return result
     
+class ScheduleRangeView(APIView):
+    """
+    Lịch chiếu nhiều rạp trong nhiều ngày với 1 request:
+    {"cinema_ids": [1, 2], "date_from": "2025-07-20", "date_to": "2025-07-26"}
+    """
+    max_days = 14
+    max_cinemas = 50
+
+    def post(self, request):
+        cinema_ids = request.data.get("cinema_ids")
+        try:
+            if not isinstance(cinema_ids, list) or not cinema_ids:
+                raise ValueError("'cinema_ids' must be a non-empty list")
+            cinema_ids = sorted({int(cinema_id) for cinema_id in cinema_ids})
+            date_from = datetime.strptime(request.data.get("date_from", ""), '%Y-%m-%d').date()
+            date_to = datetime.strptime(request.data.get("date_to", ""), '%Y-%m-%d').date()
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if date_to < date_from or (date_to - date_from).days >= self.max_days:
+            return Response({"error": f"Date range must be 1 to {self.max_days} days"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(cinema_ids) > self.max_cinemas:
+            return Response({"error": f"At most {self.max_cinemas} cinemas per request"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        start = timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        return cached_json_response(
+            'schedule_range', {'cinema_ids': cinema_ids, 'from': date_from, 'to': date_to},
+            lambda: schedule_json(cinema_ids, start, end, timezone.now()),
+            timeout=settings.SCHEDULE_CACHE_TIMEOUT)
+
 class SeatsScreen(APIView):
     def post(self, request):
         screen_id = request.data.get("screen_id", 1)
         showtime_id = request.data.get("showtime_id", 1)
-        max_number = Seat.objects.filter(screen_id=screen_id).aggregate(Max('number'))['number__max']
-        max_row = Seat.objects.filter(screen_id=screen_id).values('row').distinct().count()
-
-        queryset = Seat.objects.raw(f"""
-            SELECT 
-                s.*,
-                s.row || seat_index AS seat_name,
-                CASE 
-                    WHEN s.type = 'couple' THEN s.row || (seat_index + 1)
-                    ELSE NULL
-                END AS seat_name_couple
-            FROM (
-                SELECT 
-                    s.*,
-                    SUM(
-                        CASE 
-                            WHEN s.type = 'couple' THEN 2
-                            ELSE 1
-                        END
-                    ) OVER (
-                        PARTITION BY s.row 
-                        ORDER BY s.number 
-                        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
-                    ) - 
-                    CASE 
-                        WHEN s.type = 'couple' THEN 1
-                        ELSE 0
-                    END AS seat_index,
-                    CASE 
-                        WHEN s.id IN (
-                            SELECT bs.seat_id 
-                            FROM public.booking_seats bs
-                            JOIN public.bookings b ON bs.booking_id = b.id
-                            WHERE b.showtime_id = %s
-                        ) THEN TRUE
-                        ELSE FALSE
-                    END AS is_booking
-                FROM public.seats s
-                WHERE s.screen_id = %s
-            ) s
-            ORDER BY s.row, s.number
-        """, [showtime_id, screen_id])
-
-        data = [
-            {
-                "id": seat.id,
-                "screen_id": seat.screen_id,
-                "row": seat.row,
-                "number": seat.number,
-                "type": seat.type,
-                "is_active": seat.is_active,
-                "seat_name": seat.seat_name,
-                "seat_name_couple": seat.seat_name_couple,
-                "is_booking": not seat.is_booking,
-            }
-            for seat in queryset
-        ]
+        return Response(render_seat_map(screen_id, showtime_id))
         
-        new_data = []
-
-        rows = {}
-        for seat in data:
-            row = seat["row"] 
-            if row not in rows:
-                rows[row] = {} # rows{"A"}
-            rows[row][seat["number"]] = seat # rows{"A": ""}
-
-        for row_label in sorted(rows.keys()):
-            row_data = []
-            seat_couple = False
-            for num in range(1, max_number + 1):
-                if num in rows[row_label]:
-                    seat_temp = rows[row_label][num]
-                    
-                    if seat_temp['type'] == "couple":
-                        seat_couple = True
-                        
-                    row_data.append(seat_temp)
-                else:
-                    if seat_couple:
-                        seat_couple = False
-                    else:
-                        row_data.append(False)
-            new_data.append(row_data)
+class SeatsScreenEvents(View):
+    # Server-Sent Events: chỉ phục vụ qua ASGI (backend/asgi.py). Dưới WSGI mỗi luồng
+    # giữ 1 thread worker suốt thời gian kết nối nên từ chối thay vì làm nghẽn server
+    async def get(self, request, showtime_id):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"error": "Seat events require an ASGI server"},
+                                status=status.HTTP_501_NOT_IMPLEMENTED)
+        response = StreamingHttpResponse(
+            seat_event_stream(showtime_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
+class BestPromotionView(APIView):
+    """Báo giá giỏ ghế kèm mã khuyến mãi tốt nhất đang áp được"""
+    def post(self, request):
+        try:
+            order_value = quote_order(request.data.get('showtime_id'), request.data.get('seats_id'))
+        except (BookingError, TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        candidates = best_promotions(order_value)
+        if not candidates:
+            return Response({
+                "promotion": None,
+                "order_value": order_value,
+                "discount_amount": 0,
+                "final_amount": order_value,
+            })
+        discount, promotion = candidates[0]
         return Response({
-            "data": new_data,
-            "max_number": max_number,
-            "max_row": max_row,
+            "promotion": promotion_breakdown(promotion, discount, order_value),
+            "order_value": order_value,
+            "discount_amount": discount,
+            "final_amount": order_value - discount,
         })
-        
+
 class SeatsScreenBooking(APIView):
     def post(self, request):
         data = request.data
@@ -214,30 +356,58 @@ class SeatsScreenBooking(APIView):
         showtime_id = data.get('showtime_id')
         total_amount = data.get('total_amount')
         seats_id = data.get('seats_id')
-        
-        user = User.objects.get(id=user_id)
-        showtime = Showtime.objects.get(id=showtime_id)
-        booking = Booking.objects.create(
-            user=user,
-            showtime=showtime,
-            booking_code=get_random_string(10).upper(),  # hoặc bạn tự sinh code khác
-            total_amount=Decimal(total_amount),
-            status=Booking.BookingStatus.PENDING
-        )
-        
-        for id in seats_id:
-            seat_temp = Seat.objects.get(id = id)
-            price = showtime.base_price * 2 if seat_temp.type == "couple" else showtime.base_price
-            booking_seat = BookingSeat.objects.create(
-                booking=booking,
-                seat=seat_temp,
-                price = price,  # hoặc bạn tự sinh code khác
-            )
-            
-            seat_temp.is_active = False
-            seat_temp.save()
-            
-        return Response({"message": "OK"})
+        promotion_code = data.get('promotion_code')
+        auto_promotion = bool(data.get('auto_promotion'))
+
+        try:
+            user = User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            booking = create_booking(user, showtime_id, seats_id, total_amount,
+                                     promotion_code=promotion_code,
+                                     auto_promotion=auto_promotion)
+        except SeatConflictError as e:
+            return Response({
+                "error": str(e),
+                "conflict_seats": e.seat_ids,
+            }, status=status.HTTP_409_CONFLICT)
+        except SoldOutError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except PromotionError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except (BookingError, TypeError, ValueError) as e:
+            return Response({
+                "error": str(e),
+                "invalid_seats": getattr(e, 'seat_ids', []),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "message": "OK",
+            "booking_code": booking.booking_code,
+            "total_amount": booking.total_amount,
+        })
+
+class BookingCancelView(APIView):
+    """Huỷ booking của user đang đăng nhập (admin huỷ được mọi booking) và trả ghế"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = None if request.user.is_staff else request.user
+        try:
+            booking = cancel_booking(request.data.get('booking_id'), user=user)
+        except BookingNotFoundError as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except BookingError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "message": "OK",
+            "booking_code": booking.booking_code,
+            "status": booking.status,
+        })
+
 class CinemaCreateView(APIView):
     permission_classes = [IsAdminUser]
     @transaction.atomic
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TicketMovieConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ticket_movie'
+
+    def ready(self):
+        from ticket_movie import signals  # noqa: F401
+        from ticket_movie.db_router import check_settings
+
+        check_settings()
@@ -0,0 +1,95 @@
+"""
+JWTAuthentication đọc user từ cache trong tiến trình thay vì truy vấn bảng
+users ở mỗi request.
+
+Mỗi user được giữ tối đa settings.AUTH_USER_CACHE_TTL giây; lưu/xoá User (đổi
+role, khoá tài khoản, đổi mật khẩu...) xoá bản cache của tiến trình hiện tại
+và ghi 1 stamp mới của user vào cache Django qua signal. Mỗi request so stamp
+đó với stamp lúc nạp user nên các worker khác cũng đọc lại user ngay ở request
+kế tiếp (cần cache dùng chung, xem REDIS_URL). Mỗi request nhận 1 instance
+User riêng nên view có thể sửa và save request.user như bình thường.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from ticket_movie.models import User
+
+STAMP_KEY = 'auth_user_stamp:{user_id}'
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+
+def invalidate_cached_user(user_id):
+    with _lock:
+        _users.pop(str(user_id), None)
+    # Sau TTL mọi bản cache nạp trước thời điểm này đều đã hết hạn nên stamp không cần giữ lâu hơn
+    cache.set(STAMP_KEY.format(user_id=user_id), time.time_ns(), settings.AUTH_USER_CACHE_TTL)
+
+
+def clear_user_cache():
+    with _lock:
+        _users.clear()
+
+
+def get_cached_user(user_id):
+    """User có id = user_id (instance mới mỗi lần gọi), hoặc None nếu không tồn tại"""
+    key = str(user_id)
+    now = time.monotonic()
+    stamp = cache.get(STAMP_KEY.format(user_id=key))
+    with _lock:
+        entry = _users.get(key)
+        if entry is not None and entry[0] > now and entry[1] == stamp:
+            _users.move_to_end(key)
+        else:
+            entry = None
+
+    if entry is None:
+        field_names = [field.attname for field in User._meta.concrete_fields]
+        values = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(
+            *field_names).first()
+        if values is None:
+            return None
+        entry = (now + settings.AUTH_USER_CACHE_TTL, stamp, field_names, values)
+        with _lock:
+            _users[key] = entry
+            _users.move_to_end(key)
+            while len(_users) > settings.AUTH_USER_CACHE_SIZE:
+                _users.popitem(last=False)
+
+    _, _, field_names, values = entry
+    return User.from_db('default', field_names, values)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -0,0 +1,298 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from ticket_movie.live import publish_seat_changes
+from ticket_movie.models import Booking, BookingSeat, Seat, Showtime
+from ticket_movie.occupancy import get_bitmap, is_set, mark_seats
+from ticket_movie.promotion_index import apply_best_promotion
+from ticket_movie.promotions import redeem_promotion, release_promotions
+
+
+class BookingError(Exception):
+    """Dữ liệu đặt vé không hợp lệ (ghế không thuộc phòng chiếu, suất chiếu đã huỷ...)"""
+
+    def __init__(self, message, seat_ids=None):
+        super().__init__(message)
+        self.seat_ids = seat_ids or []
+
+
+class SeatConflictError(BookingError):
+    """Một hoặc nhiều ghế đã được người khác giữ cho suất chiếu này"""
+
+
+class SoldOutError(BookingError):
+    """Suất chiếu không còn đủ ghế trống (available_seats) cho số ghế cần giữ"""
+
+
+class BookingNotFoundError(BookingError):
+    """Booking không tồn tại hoặc không thuộc user đang thao tác"""
+
+
+def seat_price(showtime, seat_type):
+    # Ghế đôi tính giá gấp đôi
+    if seat_type == Seat.SeatType.COUPLE:
+        return showtime.base_price * 2
+    return showtime.base_price
+
+
+def quote_order(showtime_id, seat_ids):
+    """Tổng tiền của giỏ ghế theo giá suất chiếu, dùng để báo giá khi checkout"""
+    seat_ids = {int(seat_id) for seat_id in seat_ids or []}
+    try:
+        showtime = Showtime.objects.only('id', 'screen_id', 'base_price').get(id=showtime_id)
+    except Showtime.DoesNotExist:
+        raise BookingError('Showtime not found')
+    seat_types = list(Seat.objects.filter(
+        id__in=seat_ids, screen_id=showtime.screen_id, is_active=True
+    ).values_list('type', flat=True))
+    if not seat_types or len(seat_types) != len(seat_ids):
+        raise BookingError('Invalid seats for this showtime')
+    return sum((seat_price(showtime, seat_type) for seat_type in seat_types), Decimal('0'))
+
+
+def taken_seat_ids(showtime_id, seat_ids):
+    return sorted(
+        BookingSeat.objects.filter(
+            showtime_id=showtime_id, seat_id__in=seat_ids, is_active=True
+        ).values_list('seat_id', flat=True)
+    )
+
+
+def adjust_available_seats(showtime_id, delta):
+    """
+    Cộng/trừ Showtime.available_seats bằng 1 câu UPDATE có điều kiện,
+    số ghế trống không bao giờ xuống dưới 0 kể cả khi đặt đồng thời.
+    """
+    queryset = Showtime.objects.filter(id=showtime_id)
+    if delta < 0:
+        queryset = queryset.filter(available_seats__gte=-delta)
+    return queryset.update(available_seats=F('available_seats') + delta) == 1
+
+
+def create_booking(user, showtime_id, seat_ids, total_amount=None, hold_ttl=None,
+                   promotion_code=None, auto_promotion=False):
+    """
+    Đặt toàn bộ giỏ ghế trong 1 transaction.
+    Ràng buộc unique (showtime, seat) ở DB quyết định ai thắng khi đặt đồng thời.
+    Booking được tạo ở trạng thái PENDING và giữ ghế trong hold_ttl
+    (mặc định settings.BOOKING_HOLD_TTL). Mã khuyến mãi (nếu có) được áp
+    trong cùng transaction; auto_promotion=True thì tự chọn mã tốt nhất.
+    total_amount (nếu có) phải bằng tổng giá ghế tính ở server, booking luôn lưu giá server.
+    """
+    if hold_ttl is None:
+        hold_ttl = settings.BOOKING_HOLD_TTL
+    seat_ids = sorted({int(seat_id) for seat_id in seat_ids or []})
+    if not seat_ids:
+        raise BookingError('Please select at least one seat')
+
+    with transaction.atomic():
+        try:
+            showtime = Showtime.objects.only(
+                'id', 'screen_id', 'base_price', 'status').get(id=showtime_id)
+        except Showtime.DoesNotExist:
+            raise BookingError('Showtime not found')
+        if showtime.status != Showtime.ShowStatus.SCHEDULED:
+            raise BookingError('Showtime is not open for booking')
+
+        # Kiểm tra tất cả ghế trong 1 query
+        seats = list(
+            Seat.objects.filter(
+                id__in=seat_ids, screen_id=showtime.screen_id, is_active=True
+            ).only('id', 'type', 'position')
+        )
+        if len(seats) != len(seat_ids):
+            found = {seat.id for seat in seats}
+            raise BookingError(
+                'Invalid seats for this showtime',
+                [seat_id for seat_id in seat_ids if seat_id not in found])
+
+        # Kiểm tra nhanh qua bitmap, ràng buộc unique vẫn là chốt chặn cuối
+        bitmap = get_bitmap(showtime.id)
+        conflicts = [seat.id for seat in seats if is_set(bitmap, seat.position)]
+        if conflicts:
+            raise SeatConflictError('Seats already booked', conflicts)
+
+        # Giá luôn tính ở server; total_amount client gửi (nếu có) chỉ để đối chiếu
+        prices = {seat.id: seat_price(showtime, seat.type) for seat in seats}
+        expected_total = sum(prices.values(), Decimal('0'))
+        if total_amount is not None:
+            try:
+                total_amount = Decimal(str(total_amount))
+            except ArithmeticError:
+                raise BookingError('Invalid total amount')
+            if total_amount != expected_total:
+                raise BookingError('Total amount does not match the seat prices')
+
+        booking = Booking.objects.create(
+            user=user,
+            showtime_id=showtime.id,
+            booking_code=get_random_string(10).upper(),
+            total_amount=expected_total,
+            status=Booking.BookingStatus.PENDING,
+            expires_at=timezone.now() + hold_ttl
+        )
+
+        try:
+            with transaction.atomic():
+                BookingSeat.objects.bulk_create([
+                    BookingSeat(
+                        booking=booking,
+                        showtime_id=showtime.id,
+                        seat_id=seat.id,
+                        price=prices[seat.id],
+                    )
+                    for seat in seats
+                ])
+        except IntegrityError:
+            # Người khác vừa giữ ghế giữa lúc kiểm tra và insert
+            raise SeatConflictError(
+                'Seats already booked', taken_seat_ids(showtime.id, seat_ids))
+
+        if not adjust_available_seats(showtime.id, -len(seats)):
+            raise SoldOutError('Not enough seats available')
+        mark_seats(showtime.id, [seat.position for seat in seats])
+        if promotion_code:
+            redeem_promotion(booking, promotion_code)
+        elif auto_promotion:
+            apply_best_promotion(booking)
+        publish_seat_changes(showtime.id, booked=seat_ids)
+
+    return booking
+
+
+# Booking ở các trạng thái này đang giữ ghế
+HOLDING_STATUSES = (Booking.BookingStatus.PENDING, Booking.BookingStatus.CONFIRMED)
+
+
+def release_bookings(booking_ids, status, from_statuses=HOLDING_STATUSES):
+    """
+    Chuyển booking sang status (CANCELLED/EXPIRED) và trả ghế lại cho suất chiếu.
+    Chỉ booking đang ở from_statuses được xử lý, nên gọi lại nhiều lần hoặc
+    chạy song song với 1 thao tác khác cũng không trả ghế 2 lần.
+    """
+    booking_ids = sorted(set(booking_ids))
+    if not booking_ids:
+        return 0
+    with transaction.atomic():
+        booking_ids = list(
+            Booking.objects.select_for_update()
+            .filter(id__in=booking_ids, status__in=from_statuses)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        if not booking_ids:
+            return 0
+        released = BookingSeat.objects.filter(booking_id__in=booking_ids, is_active=True)
+        seats = defaultdict(dict)
+        for showtime_id, seat_id, position in released.values_list(
+                'showtime_id', 'seat_id', 'seat__position'):
+            seats[showtime_id][seat_id] = position
+        released.update(is_active=False)
+        count = Booking.objects.filter(id__in=booking_ids, status__in=from_statuses).update(
+            status=status, expires_at=None)
+        release_promotions(booking_ids)
+        # Khoá suất chiếu theo thứ tự id để tránh deadlock giữa các sweeper
+        for showtime_id in sorted(seats):
+            adjust_available_seats(showtime_id, len(seats[showtime_id]))
+            mark_seats(showtime_id, seats[showtime_id].values(), occupied=False)
+            publish_seat_changes(showtime_id, released=seats[showtime_id].keys())
+        return count
+
+
+def cancel_booking(booking_id, user=None):
+    """
+    Huỷ booking còn giữ ghế trước giờ chiếu và trả ghế.
+    user khác None thì chỉ huỷ được booking của chính user đó.
+    """
+    with transaction.atomic():
+        try:
+            booking = Booking.objects.select_for_update().get(id=booking_id)
+        except (Booking.DoesNotExist, TypeError, ValueError):
+            raise BookingNotFoundError('Booking not found')
+        if user is not None and booking.user_id != user.id:
+            raise BookingNotFoundError('Booking not found')
+        if booking.status not in HOLDING_STATUSES:
+            raise BookingError('Booking cannot be cancelled')
+        start_time = Showtime.objects.filter(id=booking.showtime_id).values_list(
+            'start_time', flat=True).get()
+        if start_time <= timezone.now():
+            raise BookingError('Showtime has already started')
+        release_bookings([booking.id], Booking.BookingStatus.CANCELLED)
+        booking.refresh_from_db(fields=['status', 'expires_at'])
+    return booking
+
+
+def expire_holds(batch_size=None, now=None):
+    """
+    Hết hạn tối đa batch_size booking PENDING đã quá expires_at.
+    Đi theo index idx_booking_pending_expiry nên không quét cả bảng bookings,
+    skip_locked cho phép chạy nhiều sweeper song song.
+    """
+    batch_size = batch_size or settings.BOOKING_EXPIRY_BATCH_SIZE
+    now = now or timezone.now()
+    with transaction.atomic():
+        booking_ids = list(
+            Booking.objects.select_for_update(skip_locked=True)
+            .filter(status=Booking.BookingStatus.PENDING, expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        return release_bookings(booking_ids, Booking.BookingStatus.EXPIRED,
+                                from_statuses=[Booking.BookingStatus.PENDING])
+
+
+def _count_subquery(queryset, group_field):
+    return Coalesce(Subquery(
+        queryset.order_by().values(group_field).annotate(c=Count('id')).values('c')
+    ), Value(0))
+
+
+def with_expected_available_seats(queryset):
+    """Ghế trống đúng = số ghế đang hoạt động của phòng chiếu - số ghế đang được giữ"""
+    return queryset.annotate(
+        seat_total=_count_subquery(
+            Seat.objects.filter(screen_id=OuterRef('screen_id'), is_active=True), 'screen_id'),
+        booked_total=_count_subquery(
+            BookingSeat.objects.filter(showtime_id=OuterRef('id'), is_active=True), 'showtime_id'),
+    )
+
+
+def count_available_seats(screen_id, showtime_id=None):
+    available = Seat.objects.filter(screen_id=screen_id, is_active=True).count()
+    if showtime_id is not None:
+        available -= BookingSeat.objects.filter(showtime_id=showtime_id, is_active=True).count()
+    return max(available, 0)
+
+
+def reconcile_available_seats(showtime_ids, apply=True):
+    """
+    So sánh available_seats với số tính lại từ seats/booking_seats.
+    Trả về [(showtime_id, giá trị đang lưu, giá trị đúng)] của các suất chiếu bị lệch.
+    """
+    rows = with_expected_available_seats(
+        Showtime.objects.filter(id__in=list(showtime_ids))
+    ).values_list('id', 'screen_id', 'available_seats', 'seat_total', 'booked_total')
+
+    drifted = []
+    for showtime_id, screen_id, stored, seat_total, booked_total in rows:
+        expected = max(seat_total - booked_total, 0)
+        if stored != expected:
+            drifted.append((showtime_id, screen_id, stored, expected))
+
+    result = []
+    for showtime_id, screen_id, stored, expected in drifted:
+        if apply:
+            # Khoá suất chiếu rồi đếm lại để không bỏ sót booking đang diễn ra
+            with transaction.atomic():
+                list(Showtime.objects.select_for_update().filter(id=showtime_id).values_list('id'))
+                expected = count_available_seats(screen_id, showtime_id)
+                Showtime.objects.filter(id=showtime_id).update(available_seats=expected)
+        result.append((showtime_id, stored, expected))
+    return result
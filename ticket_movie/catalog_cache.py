@@ -0,0 +1,101 @@
+"""
+Cache response của các API đọc danh mục (phim, rạp, lịch chiếu).
+
+Khoá cache gắn với 1 số phiên bản danh mục; mỗi lần admin ghi Movie, City,
+Cinema, Screen, Showtime thì phiên bản tăng sau khi commit nên các bản cache cũ
+không bao giờ được đọc lại. Với LocMemCache, phiên bản chỉ có hiệu lực trong 1
+tiến trình: chạy nhiều worker thì dùng cache dùng chung (FileBasedCache...).
+"""
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from ticket_movie.db_router import pin_to_primary
+
+VERSION_KEY = 'catalog:version'
+# Scope ghim về primary sau khi danh mục thay đổi (ticket_movie/db_router.py)
+PIN_SCOPE = 'catalog'
+
+
+def get_cache_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Khởi tạo theo thời gian để không trùng phiên bản cũ nếu khoá bị cache đẩy ra
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Tăng phiên bản lưu ở key khi transaction hiện tại commit"""
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def get_catalog_version():
+    return get_cache_version(VERSION_KEY)
+
+
+def bump_catalog_version():
+    # on_commit chạy theo thứ tự đăng ký: ghim về primary trước rồi mới đổi phiên bản,
+    # nếu không request đọc chen giữa 2 bước sẽ lưu dữ liệu cũ của replica vào phiên bản mới
+    pin_to_primary(PIN_SCOPE)
+    bump_cache_version(VERSION_KEY)
+
+
+def _cache_key(version, name, params):
+    digest = hashlib.md5(
+        json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'catalog:{version}:{name}:{digest}'
+
+
+def _render(content):
+    if isinstance(content, str):
+        return content.encode('utf-8')
+    if not isinstance(content, bytes):
+        return JSONRenderer().render(content)
+    return content
+
+
+def cached_json_response(name, params, build, timeout=None):
+    """
+    Trả về JSON đã render sẵn từ cache, hoặc gọi build() rồi lưu lại.
+    params là các tham số request ảnh hưởng tới kết quả; build() có thể trả về
+    dữ liệu Python hoặc chuỗi JSON đã dựng sẵn (ví dụ từ PostgreSQL).
+    Danh mục đổi phiên bản trong lúc build() thì kết quả không được cache vì
+    có thể đã đọc dữ liệu trước lần ghi đó.
+    """
+    version = get_catalog_version()
+    key = _cache_key(version, name, params)
+    content = cache.get(key)
+    if content is None:
+        content = _render(build())
+        if get_catalog_version() == version:
+            cache.set(key, content, timeout or settings.CATALOG_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type='application/json')
+
+
+async def acached_json_response(name, params, build, timeout=None):
+    """Bản async của cached_json_response, build là coroutine function"""
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = await sync_to_async(get_catalog_version)()
+    key = _cache_key(version, name, params)
+    content = await cache.aget(key)
+    if content is None:
+        content = _render(await build())
+        if await cache.aget(VERSION_KEY) == version:
+            await cache.aset(key, content, timeout or settings.CATALOG_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type='application/json')
@@ -0,0 +1,185 @@
+"""
+Chuyển truy vấn đọc của các API đọc công khai sang replica (settings.DATABASE_REPLICAS).
+
+Chỉ các truy vấn đọc nằm trong read_from_replica() mới đi tới replica, mọi
+truy vấn khác (ghi, đọc trong transaction đặt vé...) vẫn ở primary (default).
+Replica có thể chậm hơn primary vài giây nên các scope vừa ghi được ghim về
+primary trong settings.DATABASE_REPLICA_PIN_SECONDS giây:
+- user: PrimaryPinMiddleware ghim user (theo JWT) của request có ghi DB, ví dụ
+  đặt vé, sửa profile, để user đó luôn đọc được dữ liệu mình vừa ghi;
+- dữ liệu được cache: danh mục (catalog) và sơ đồ ghế từng phòng chiếu được
+  ghim khi bị xoá cache để cache không nạp lại bản cũ từ replica.
+Thông tin ghim lưu trong cache nên bật replica bắt buộc phải có cache dùng
+chung cho mọi worker (check_settings() chạy khi khởi động app).
+"""
+import random
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+PIN_KEY = 'db:pin:{scope}'
+# Cache riêng của từng tiến trình: worker khác không thấy thông tin ghim
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+_read_replica = ContextVar('read_replica', default=False)
+_request_state = ContextVar('request_state', default=None)
+
+
+def check_settings():
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DATABASE_REPLICAS and backend in LOCAL_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f'DB_REPLICAS needs a cache shared by all workers, got {backend}. Set REDIS_URL.')
+
+
+class RequestState:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.wrote = False
+
+    def scopes(self):
+        return [] if self.user_id is None else [user_scope(self.user_id)]
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def request_user_id(request):
+    """id user trong JWT của request (không truy vấn DB), hoặc None"""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        return None
+
+
+def _pin_keys(scopes):
+    state = _request_state.get()
+    if state is not None:
+        scopes = [*scopes, *state.scopes()]
+    return [PIN_KEY.format(scope=scope) for scope in scopes]
+
+
+def pin_to_primary(scope):
+    """Các truy vấn đọc của scope đi tới primary trong DATABASE_REPLICA_PIN_SECONDS giây"""
+    if settings.DATABASE_REPLICAS:
+        transaction.on_commit(lambda: cache.set(
+            PIN_KEY.format(scope=scope), True, settings.DATABASE_REPLICA_PIN_SECONDS))
+
+
+@contextmanager
+def read_from_replica(*scopes):
+    """
+    Truy vấn đọc trong khối này đi tới 1 replica, trừ khi user của request hiện
+    tại hoặc 1 trong các scope vừa được ghim về primary.
+    """
+    if not settings.DATABASE_REPLICAS or cache.get_many(_pin_keys(scopes)):
+        yield
+        return
+    token = _read_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+@asynccontextmanager
+async def aread_from_replica(*scopes):
+    if not settings.DATABASE_REPLICAS or await cache.aget_many(_pin_keys(scopes)):
+        yield
+        return
+    token = _read_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _read_replica.get():
+            return None
+        state = _request_state.get()
+        # Request đã ghi thì đọc tiếp từ primary để thấy dữ liệu vừa ghi
+        if state is not None and state.wrote:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replica nhận schema từ primary qua replication, migrate --database replicaN không làm gì
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica là bản sao của primary nên object ở 2 nơi liên kết với nhau được
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class PrimaryPinMiddleware:
+    """Ghim user của request có ghi DB về primary, xem pin_to_primary()"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        state = RequestState(request_user_id(request))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote and state.user_id is not None:
+            cache.set(PIN_KEY.format(scope=user_scope(state.user_id)), True,
+                      settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        state = RequestState(request_user_id(request))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote and state.user_id is not None:
+            await cache.aset(PIN_KEY.format(scope=user_scope(state.user_id)), True,
+                             settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
@@ -0,0 +1,29 @@
+"""
+Password hasher có chi phí lấy từ settings để chỉnh theo máy chủ (đo bằng
+lệnh benchmark_password_hashers). Giữ nguyên tên thuật toán của Django nên
+hash cũ vẫn kiểm tra được; khi chi phí hoặc hasher ưu tiên thay đổi, mật khẩu
+được hash lại lúc user đăng nhập (User.check_password).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+def scrypt_maxmem(work_factor, block_size):
+    # scrypt cần khoảng 128 * n * r byte; chừa gấp đôi vì OpenSSL mặc định chỉ cho 32MB
+    return 256 * work_factor * block_size
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def maxmem(self):
+        return scrypt_maxmem(self.work_factor, self.block_size)
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import polib
+from django.conf import settings
+
+TRANSLATION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'translations'))
+
+# Chỉ chấp nhận mã ngôn ngữ dạng en, vi, pt_BR, zh-Hant... để không đọc file ngoài thư mục
+LANG_RE = re.compile(r'^[A-Za-z]{2,3}([_-][A-Za-z0-9]{2,8})?$')
+
+
+class Catalog:
+    """Bản dịch đã biên dịch sẵn: dict msgid→msgstr, JSON và ETag tương ứng"""
+
+    def __init__(self, translations):
+        self.translations = translations
+        self.content = json.dumps(
+            translations, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.etag = '"%s"' % hashlib.sha256(self.content).hexdigest()
+
+
+_catalogs = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_catalog(filepath):
+    po = polib.pofile(filepath)
+    return Catalog({entry.msgid: entry.msgstr for entry in po if entry.msgstr})
+
+
+def get_catalog(lang):
+    """
+    Lấy bản dịch theo ngôn ngữ, chỉ parse lại file .po khi file thay đổi.
+    Trả về None nếu không có file dịch cho ngôn ngữ này.
+    """
+    if not LANG_RE.match(lang):
+        return None
+    filepath = os.path.join(TRANSLATION_DIR, f"{lang}.po")
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+
+    key = (lang, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        catalog = _catalogs.get(key)
+        if catalog is not None:
+            _catalogs.move_to_end(key)
+            return catalog
+
+    catalog = compile_catalog(filepath)
+    with _lock:
+        # Bỏ bản cũ của cùng ngôn ngữ rồi giới hạn kích thước cache (LRU)
+        for old_key in [k for k in _catalogs if k[0] == lang]:
+            del _catalogs[old_key]
+        _catalogs[key] = catalog
+        while len(_catalogs) > settings.TRANSLATION_CACHE_SIZE:
+            _catalogs.popitem(last=False)
+    return catalog
@@ -0,0 +1,213 @@
+"""
+Đẩy thay đổi trạng thái ghế của suất chiếu tới client đang xem sơ đồ ghế.
+
+Broker mặc định (PostgresBroker) gửi sự kiện qua LISTEN/NOTIFY nên worker web
+nào cũng nhận được sự kiện của worker khác và của lệnh expire_bookings (chạy
+trong tiến trình riêng). LocalBroker chỉ fan-out trong 1 tiến trình, dùng khi
+test hoặc chạy thử 1 worker không có sweeper.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def showtime_channel(showtime_id):
+    return f'showtime.{showtime_id}'
+
+
+class Subscription:
+    def __init__(self, broker, channel, queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Client đọc chậm: bỏ các delta cũ, báo client tải lại toàn bộ sơ đồ ghế
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Fan-out trong tiến trình tới hàng đợi asyncio của từng subscriber"""
+
+    queue_size = 100
+    # Sự kiện publish ở tiến trình khác có tới được subscriber của tiến trình này không
+    cross_process = False
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+    def dispatch(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Event loop của subscriber đã đóng
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel):
+        """Phải gọi bên trong event loop sẽ đọc subscription"""
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Gửi sự kiện qua NOTIFY; mỗi tiến trình có 1 thread LISTEN rồi fan-out
+    cho subscriber của tiến trình đó.
+    """
+
+    pg_channel = 'seat_events'
+    poll_timeout = 5
+    cross_process = True
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, payload])
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name='seat-events-listener', daemon=True)
+                self._listener.start()
+
+    def _connect(self):
+        db = connections['default']
+        params = db.settings_dict
+        conn = db.Database.connect(
+            dbname=params['NAME'], user=params['USER'], password=params['PASSWORD'],
+            host=params['HOST'], port=params['PORT'])
+        conn.autocommit = True
+        conn.cursor().execute(f'LISTEN {self.pg_channel}')
+        return conn
+
+    def _listen(self):
+        while True:
+            try:
+                conn = self._connect()
+                try:
+                    while True:
+                        for notify in self._notifies(conn):
+                            data = json.loads(notify.payload)
+                            self.dispatch(data['channel'], data['message'])
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception('Seat events listener failed, reconnecting')
+                time.sleep(self.poll_timeout)
+
+    def _notifies(self, conn):
+        if hasattr(conn, 'poll'):
+            # psycopg2
+            if select.select([conn], [], [], self.poll_timeout)[0]:
+                conn.poll()
+                while conn.notifies:
+                    yield conn.notifies.pop(0)
+        else:
+            # psycopg 3
+            yield from conn.notifies(timeout=self.poll_timeout)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.SEAT_EVENTS_BROKER)()
+        return _broker
+
+
+def publish_seat_changes(showtime_id, booked=(), released=()):
+    """Gửi delta ghế sau khi transaction hiện tại commit thành công"""
+    message = {
+        'type': 'seats',
+        'showtime_id': showtime_id,
+        'booked': sorted(booked),
+        'released': sorted(released),
+    }
+
+    def publish():
+        try:
+            get_broker().publish(showtime_channel(showtime_id), message)
+        except Exception:
+            # Không để lỗi đẩy sự kiện làm hỏng luồng đặt vé đã commit
+            logger.exception('Could not publish seat changes for showtime %s', showtime_id)
+
+    transaction.on_commit(publish)
+
+
+async def seat_event_stream(showtime_id, heartbeat=15, max_lifetime=None):
+    """
+    Luồng Server-Sent Events cho 1 suất chiếu, kèm heartbeat giữ kết nối.
+    Luồng kết thúc sau max_lifetime giây (mặc định settings.SEAT_EVENTS_MAX_STREAM_SECONDS),
+    client kết nối lại và tải lại sơ đồ ghế để không bỏ sót delta trong lúc ngắt.
+    """
+    if max_lifetime is None:
+        max_lifetime = settings.SEAT_EVENTS_MAX_STREAM_SECONDS
+    deadline = time.monotonic() + max_lifetime
+    subscription = get_broker().subscribe(showtime_channel(showtime_id))
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                message = await asyncio.wait_for(subscription.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if time.monotonic() < deadline:
+                    yield ': ping\n\n'
+                continue
+            yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,90 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+# Tên chế độ: biến môi trường đọc bởi DATABASES trong backend/settings.py
+MODES = {
+    'none': {'DB_POOL': '', 'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_POOL': '', 'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'true'},
+    'pool': {'DB_POOL': 'true'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Đo độ trễ mỗi request phần cơ sở dữ liệu (mở/lấy kết nối, chạy 1 truy vấn, '
+            'kết thúc request) khi không giữ kết nối, giữ kết nối (CONN_MAX_AGE) và dùng pool '
+            'của psycopg 3. Mỗi chế độ chạy trong 1 tiến trình riêng với DATABASES tương ứng')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', action='append', choices=sorted(MODES),
+                            help='Chế độ cần đo, lặp lại để đo nhiều chế độ (mặc định tất cả)')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Tổng số request giả lập cho mỗi chế độ')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Số luồng gửi request song song, giống số luồng của 1 worker')
+        parser.add_argument('--warmup', type=int, default=50,
+                            help='Số request đầu tiên không tính vào kết quả')
+        parser.add_argument('--query', default='SELECT 1',
+                            help='Câu SQL chạy trong mỗi request')
+        parser.add_argument('--worker', action='store_true', help='Dùng nội bộ: chạy 1 chế độ')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run(options)))
+            return
+
+        self.stdout.write(f'{"mode":<11} {"req/s":>9} {"mean ms":>8} {"p50 ms":>8} {"p95 ms":>8} '
+                          f'{"p99 ms":>8} {"max ms":>8} ({options["concurrency"]} thread(s))')
+        for mode in options['mode'] or MODES:
+            command = [sys.executable, '-m', 'django', 'benchmark_db_connections', '--worker',
+                       '--requests', str(options['requests']),
+                       '--concurrency', str(options['concurrency']),
+                       '--warmup', str(options['warmup']), '--query', options['query']]
+            result = subprocess.run(command, env={**os.environ, **MODES[mode]},
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                error = (result.stderr.strip().splitlines() or ['unknown error'])[-1]
+                self.stdout.write(f'{mode:<11} failed: {error}')
+                continue
+            self.report(mode, **json.loads(result.stdout.strip().splitlines()[-1]))
+
+    def report(self, mode, elapsed, latencies):
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        self.stdout.write(
+            f'{mode:<11} {len(latencies) / elapsed:>9.1f} {statistics.mean(latencies) * 1000:>8.2f} '
+            f'{statistics.median(latencies) * 1000:>8.2f} {percentile(0.95):>8.2f} '
+            f'{percentile(0.99):>8.2f} {latencies[-1] * 1000:>8.2f}')
+
+    def run(self, options):
+        query = options['query']
+
+        def handle_request(_):
+            # Giống vòng đời 1 request của Django: close_old_connections chạy ở đầu và
+            # cuối request, đóng kết nối hoặc trả về pool tuỳ cấu hình
+            started = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(query)
+                    cursor.fetchall()
+            finally:
+                request_finished.send(sender=self.__class__)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(handle_request, range(options['warmup'])))
+            started = time.perf_counter()
+            latencies = list(pool.map(handle_request, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+        return {'elapsed': elapsed, 'latencies': latencies}
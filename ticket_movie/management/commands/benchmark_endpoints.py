@@ -0,0 +1,142 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Tên: (method, đường dẫn view sync, đường dẫn view async)
+ENDPOINTS = {
+    'translate': ('GET', 'translate/?lang={lang}', 'async/translate/?lang={lang}'),
+    'main': ('GET', 'main/data/', 'async/main/data/'),
+    'schedule': ('POST', 'main/movies/schedule/', 'async/main/movies/schedule/'),
+    'seats': ('POST', 'main/screen/seat/', 'async/main/screen/seat/'),
+}
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+class Command(BaseCommand):
+    help = ('Đo số request/giây và độ trễ (p50/p95/p99) của các API đọc công khai, '
+            'so sánh bản sync với bản async ở cùng mức đồng thời. Server cần chạy sẵn, '
+            'ví dụ uvicorn backend.asgi:application --workers 4')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/app/api/',
+                            help='URL gốc của ticket_movie.app.urls')
+        parser.add_argument('--sync-base-url',
+                            help='URL gốc riêng cho bản sync, ví dụ 1 server WSGI (mặc định --base-url)')
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS),
+                            help='API cần đo, lặp lại để đo nhiều API (mặc định tất cả)')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Số kết nối keep-alive gửi request song song')
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Tổng số request cho mỗi API và mỗi bản')
+        parser.add_argument('--lang', default='vi')
+        parser.add_argument('--cinema-id', type=int, default=1)
+        parser.add_argument('--day', default=None, help='Ngày cho lịch chiếu, mặc định hôm nay')
+        parser.add_argument('--screen-id', type=int, default=1)
+        parser.add_argument('--showtime-id', type=int, default=1)
+
+    def handle(self, *args, **options):
+        bodies = {
+            'schedule': {'cinema_id': options['cinema_id'],
+                         'day': options['day'] or timezone.localdate().isoformat()},
+            'seats': {'screen_id': options['screen_id'], 'showtime_id': options['showtime_id']},
+        }
+        base_url = options['base_url'].rstrip('/') + '/'
+        sync_base_url = (options['sync_base_url'] or base_url).rstrip('/') + '/'
+
+        self.stdout.write(f'{"endpoint":<10} {"variant":<6} {"req/s":>9} {"p50 ms":>8} '
+                          f'{"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} {"errors":>7}')
+        for name in options['endpoint'] or ENDPOINTS:
+            method, sync_path, async_path = ENDPOINTS[name]
+            body = json.dumps(bodies[name]).encode() if name in bodies else None
+            for variant, url in (('sync', sync_base_url + sync_path), ('async', base_url + async_path)):
+                url = url.format(lang=options['lang'])
+                try:
+                    result = asyncio.run(self.run(method, url, body, options['concurrency'],
+                                                  options['requests']))
+                except OSError as e:
+                    raise CommandError(f'Cannot connect to {url}: {e}')
+                self.report(name, variant, *result)
+
+    def report(self, name, variant, elapsed, latencies, errors):
+        if not latencies:
+            self.stdout.write(f'{name:<10} {variant:<6} all {errors} request(s) failed')
+            return
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        self.stdout.write(
+            f'{name:<10} {variant:<6} {len(latencies) / elapsed:>9.1f} '
+            f'{statistics.median(latencies) * 1000:>8.1f} {percentile(0.95):>8.1f} '
+            f'{percentile(0.99):>8.1f} {latencies[-1] * 1000:>8.1f} {errors:>7}')
+
+    async def run(self, method, url, body, concurrency, total):
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+        target = parts.path + (f'?{parts.query}' if parts.query else '')
+        headers = [f'{method} {target} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: keep-alive']
+        if body is not None:
+            headers += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        request = ('\r\n'.join(headers) + '\r\n\r\n').encode() + (body or b'')
+
+        latencies = []
+        errors = 0
+        remaining = total
+
+        async def worker():
+            nonlocal remaining, errors
+            reader = writer = None
+            while remaining > 0:
+                remaining -= 1
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(
+                            host, port, ssl=parts.scheme == 'https' or None)
+                    started = time.perf_counter()
+                    writer.write(request)
+                    await writer.drain()
+                    status, keep_alive = await read_response(reader)
+                    if status >= 400:
+                        errors += 1
+                    else:
+                        latencies.append(time.perf_counter() - started)
+                    if not keep_alive:
+                        writer.close()
+                        writer = None
+                except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    if writer is not None:
+                        writer.close()
+                    writer = None
+            if writer is not None:
+                writer.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+        return time.perf_counter() - started, latencies, errors
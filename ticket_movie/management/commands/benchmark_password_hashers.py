@@ -0,0 +1,92 @@
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+from ticket_movie.hashers import scrypt_maxmem
+
+PASSWORD = 'Benchmark-Password-2025'
+
+
+def pbkdf2_hasher(iterations):
+    hasher = PBKDF2PasswordHasher()
+    hasher.iterations = iterations
+    return hasher
+
+
+def scrypt_hasher(work_factor):
+    hasher = ScryptPasswordHasher()
+    hasher.work_factor = work_factor
+    hasher.maxmem = scrypt_maxmem(work_factor, hasher.block_size)
+    return hasher
+
+
+def int_list(value):
+    try:
+        return [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise CommandError(f"Expected a comma separated list of integers, got '{value}'")
+
+
+class Command(BaseCommand):
+    help = ('Đo thời gian kiểm tra mật khẩu (latency) và số lần kiểm tra/giây (throughput) '
+            'của PBKDF2 và scrypt ở các mức chi phí trên máy hiện tại')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pbkdf2-iterations', type=int_list,
+                            default=[260_000, 600_000, 1_000_000, 1_500_000],
+                            help='Các số vòng lặp PBKDF2, phân cách bằng dấu phẩy')
+        parser.add_argument('--scrypt-work-factors', type=int_list,
+                            default=[2 ** 14, 2 ** 15, 2 ** 16],
+                            help='Các work factor (N) của scrypt, phân cách bằng dấu phẩy')
+        parser.add_argument('--rounds', type=int, default=10,
+                            help='Số lần kiểm tra để đo latency mỗi cấu hình')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Số luồng chạy song song khi đo throughput')
+        parser.add_argument('--budget-ms', type=float, default=250,
+                            help='Ngưỡng latency p95 (ms) chấp nhận được cho 1 lần đăng nhập')
+
+    def handle(self, *args, **options):
+        rounds = max(options['rounds'], 1)
+        workers = max(options['workers'], 1)
+        configs = (
+            [('pbkdf2_sha256', f'iterations={n}', pbkdf2_hasher(n))
+             for n in sorted(options['pbkdf2_iterations'])]
+            + [('scrypt', f'work_factor={n}', scrypt_hasher(n))
+               for n in sorted(options['scrypt_work_factors'])]
+        )
+
+        self.stdout.write(f'{"hasher":<14} {"cost":<22} {"p50 ms":>9} {"p95 ms":>9} '
+                          f'{"verify/s":>10} ({workers} worker(s))')
+        best = {}
+        for algorithm, cost, hasher in configs:
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                hasher.verify(PASSWORD, encoded)
+                timings.append((time.perf_counter() - started) * 1000)
+            p50 = statistics.median(timings)
+            p95 = sorted(timings)[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+            # hashlib nhả GIL khi hash nên các luồng chạy song song thật trên nhiều CPU
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda _: hasher.verify(PASSWORD, encoded), range(rounds * workers)))
+            throughput = rounds * workers / (time.perf_counter() - started)
+
+            self.stdout.write(f'{algorithm:<14} {cost:<22} {p50:>9.1f} {p95:>9.1f} {throughput:>10.1f}')
+            if p95 <= options['budget_ms']:
+                best[algorithm] = cost
+
+        self.stdout.write('')
+        self.stdout.write(f'Current settings: PASSWORD_PBKDF2_ITERATIONS={settings.PASSWORD_PBKDF2_ITERATIONS}, '
+                          f'PASSWORD_SCRYPT_WORK_FACTOR={settings.PASSWORD_SCRYPT_WORK_FACTOR}')
+        for algorithm, cost in best.items():
+            self.stdout.write(f'Highest {algorithm} cost within {options["budget_ms"]:g} ms p95: {cost}')
+        if not best:
+            self.stdout.write(f'No configuration stays within {options["budget_ms"]:g} ms p95')
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ticket_movie.booking import expire_holds
+from ticket_movie.live import get_broker
+
+
+class Command(BaseCommand):
+    help = 'Chuyển các booking PENDING quá hạn giữ ghế sang EXPIRED và trả ghế'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Số booking mỗi batch (mặc định BOOKING_EXPIRY_BATCH_SIZE)')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Số giây nghỉ giữa các lượt quét khi chạy liên tục')
+        parser.add_argument('--once', action='store_true',
+                            help='Chỉ quét 1 lượt rồi thoát')
+
+    def handle(self, *args, **options):
+        # Lệnh chạy trong tiến trình riêng: với LocalBroker sự kiện trả ghế không tới được client SSE
+        if not get_broker().cross_process:
+            raise CommandError(
+                f'{settings.SEAT_EVENTS_BROKER} only delivers seat events inside one process; '
+                'set SEAT_EVENTS_BROKER to ticket_movie.live.PostgresBroker')
+        batch_size = options['batch_size'] or settings.BOOKING_EXPIRY_BATCH_SIZE
+        while True:
+            total = 0
+            # Hết batch đầy thì quét tiếp ngay, batch thiếu nghĩa là đã hết booking quá hạn
+            while True:
+                expired = expire_holds(batch_size=batch_size)
+                total += expired
+                if expired < batch_size:
+                    break
+            if total:
+                self.stdout.write(f'Expired {total} booking(s)')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,42 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ticket_movie.showtime_import import FORMATS, guess_format, import_showtimes
+
+
+class Command(BaseCommand):
+    help = 'Nhập lịch chiếu hàng loạt từ file CSV hoặc JSON Lines (dùng - để đọc từ stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Đường dẫn file, hoặc - cho stdin')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Định dạng file, mặc định đoán theo đuôi file')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Số dòng mỗi lần bulk_create (mặc định SHOWTIME_IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ kiểm tra dữ liệu, không ghi vào database')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        if fmt is None:
+            raise CommandError('Cannot guess the file format, use --format')
+
+        def on_error(item):
+            self.stderr.write(json.dumps(item, ensure_ascii=False))
+
+        kwargs = dict(chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+                      max_errors=0, on_error=on_error)
+        if options['path'] == '-':
+            result = import_showtimes(sys.stdin.buffer, fmt, **kwargs)
+        else:
+            try:
+                with open(options['path'], 'rb') as stream:
+                    result = import_showtimes(stream, fmt, **kwargs)
+            except OSError as e:
+                raise CommandError(e)
+
+        self.stdout.write(f'Read {result.total} row(s): {result.created} '
+                          + ('valid' if result.dry_run else 'created')
+                          + f', {result.failed} failed')
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ticket_movie.token_blacklist import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Xoá theo batch các refresh token (outstanding và blacklisted) đã hết hạn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Số token mỗi batch (mặc định TOKEN_PRUNE_BATCH_SIZE)')
+        parser.add_argument('--interval', type=float, default=3600,
+                            help='Số giây nghỉ giữa các lượt dọn khi chạy liên tục')
+        parser.add_argument('--once', action='store_true',
+                            help='Chỉ dọn 1 lượt rồi thoát')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.TOKEN_PRUNE_BATCH_SIZE
+        while True:
+            total = 0
+            while True:
+                pruned = prune_expired_tokens(batch_size=batch_size)
+                total += pruned
+                if pruned < batch_size:
+                    break
+            if total:
+                self.stdout.write(f'Pruned {total} expired token(s)')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ticket_movie.management.showtime_range import add_showtime_range_arguments, showtime_id_batches
+from ticket_movie.occupancy import rebuild_bitmaps
+
+
+class Command(BaseCommand):
+    help = 'Kiểm tra và dựng lại bitmap ghế đã đặt của suất chiếu từ booking_seats'
+
+    def add_arguments(self, parser):
+        add_showtime_range_arguments(parser)
+        parser.add_argument('--verify', action='store_true',
+                            help='Chỉ báo cáo suất chiếu bị lệch, không sửa')
+
+    def handle(self, *args, **options):
+        apply = not options['verify']
+        checked = 0
+        drifted = []
+        for batch in showtime_id_batches(options):
+            drifted += rebuild_bitmaps(batch, apply=apply)
+            checked += len(batch)
+
+        for showtime_id in drifted:
+            self.stdout.write(f'Showtime {showtime_id}: bitmap out of sync'
+                              + (' (repaired)' if apply else ''))
+        self.stdout.write(f'Checked {checked} showtime(s), {len(drifted)} out of sync')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ticket_movie.booking import reconcile_available_seats
+from ticket_movie.management.showtime_range import add_showtime_range_arguments, showtime_id_batches
+
+
+class Command(BaseCommand):
+    help = 'Tính lại Showtime.available_seats từ seats/booking_seats và báo cáo chênh lệch'
+
+    def add_arguments(self, parser):
+        add_showtime_range_arguments(parser)
+        parser.add_argument('--verify', action='store_true',
+                            help='Chỉ báo cáo suất chiếu bị lệch, không sửa')
+
+    def handle(self, *args, **options):
+        apply = not options['verify']
+        checked = 0
+        drifted = 0
+        for batch in showtime_id_batches(options):
+            for showtime_id, stored, expected in reconcile_available_seats(batch, apply=apply):
+                drifted += 1
+                self.stdout.write(
+                    f'Showtime {showtime_id}: available_seats {stored} -> {expected}'
+                    + ('' if apply else ' (not fixed)'))
+            checked += len(batch)
+        self.stdout.write(f'Checked {checked} showtime(s), {drifted} out of sync')
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from ticket_movie.models import Showtime
+
+
+def add_showtime_range_arguments(parser):
+    parser.add_argument('--showtime', type=int, action='append', dest='showtime_ids',
+                        help='Id suất chiếu cần kiểm tra (có thể lặp lại)')
+    parser.add_argument('--from', dest='date_from', help='Từ ngày chiếu YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', help='Đến ngày chiếu YYYY-MM-DD')
+    parser.add_argument('--batch-size', type=int, default=500)
+
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError('Dates must use the YYYY-MM-DD format')
+
+
+def showtime_id_batches(options):
+    """Chia id các suất chiếu khớp --showtime/--from/--to thành từng batch"""
+    showtimes = Showtime.objects.order_by('id')
+    if options['showtime_ids']:
+        showtimes = showtimes.filter(id__in=options['showtime_ids'])
+    if options['date_from']:
+        day = _parse_day(options['date_from'])
+        showtimes = showtimes.filter(
+            start_time__gte=timezone.make_aware(datetime.combine(day, datetime.min.time())))
+    if options['date_to']:
+        day = _parse_day(options['date_to'])
+        showtimes = showtimes.filter(
+            start_time__lte=timezone.make_aware(datetime.combine(day, datetime.max.time())))
+
+    ids = list(showtimes.values_list('id', flat=True))
+    batch_size = options['batch_size']
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
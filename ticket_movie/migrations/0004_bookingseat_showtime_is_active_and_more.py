@@ -0,0 +1,83 @@
+# Generated by Django 5.2.4 on 2025-07-20 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0003_alter_user_options_alter_user_managers_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingseat',
+            name='showtime',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='ticket_movie.showtime'),
+        ),
+        migrations.AddField(
+            model_name='bookingseat',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        # Điền showtime cho các dòng cũ từ booking tương ứng
+        migrations.RunSQL(
+            sql="""
+                UPDATE booking_seats bs
+                SET showtime_id = b.showtime_id
+                FROM bookings b
+                WHERE bs.booking_id = b.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Ghế của booking đã huỷ/hết hạn không còn giữ chỗ
+        migrations.RunSQL(
+            sql="""
+                UPDATE booking_seats bs
+                SET is_active = FALSE
+                FROM bookings b
+                WHERE bs.booking_id = b.id
+                  AND b.status IN ('cancelled', 'expired')
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Dữ liệu cũ có thể đã bị đặt trùng: giữ lại dòng đặt trước nhất
+        migrations.RunSQL(
+            sql="""
+                UPDATE booking_seats
+                SET is_active = FALSE
+                WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (
+                            PARTITION BY showtime_id, seat_id ORDER BY id
+                        ) AS rn
+                        FROM booking_seats
+                        WHERE is_active
+                    ) d
+                    WHERE d.rn > 1
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Code đặt vé cũ tắt is_active của ghế vật lý sau mỗi lần đặt; trạng thái đặt chỗ
+        # giờ nằm ở booking_seats nên bật lại các ghế đó để đặt được cho suất chiếu khác
+        migrations.RunSQL(
+            sql="""
+                UPDATE seats
+                SET is_active = TRUE
+                WHERE NOT is_active
+                  AND id IN (SELECT seat_id FROM booking_seats)
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='bookingseat',
+            name='showtime',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ticket_movie.showtime'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingseat',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('showtime', 'seat'), name='unique_active_showtime_seat'),
+        ),
+    ]
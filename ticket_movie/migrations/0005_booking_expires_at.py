@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0004_bookingseat_showtime_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Booking PENDING cũ để expires_at = NULL: code cũ không bao giờ xác nhận booking nên
+        # đó là vé đã bán; sweeper chỉ quét expires_at <= now nên bỏ qua các dòng này
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['expires_at'], name='idx_booking_pending_expiry'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:05
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def build_seat_bitmaps(apps, schema_editor):
+    # Dựng bitmap ghế đã đặt cho các suất chiếu hiện có từ booking_seats
+    BookingSeat = apps.get_model('ticket_movie', 'BookingSeat')
+    Showtime = apps.get_model('ticket_movie', 'Showtime')
+
+    positions = defaultdict(list)
+    rows = BookingSeat.objects.filter(is_active=True).values_list('showtime_id', 'seat__position')
+    for showtime_id, position in rows.iterator():
+        positions[showtime_id].append(position)
+
+    for showtime_id, seat_positions in positions.items():
+        data = bytearray((max(seat_positions) // 8) + 1)
+        for position in seat_positions:
+            data[position // 8] |= 1 << (position % 8)
+        Showtime.objects.filter(id=showtime_id).update(seat_bitmap=bytes(data).rstrip(b'\x00'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0005_booking_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seat',
+            name='position',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        # Đánh vị trí cho ghế hiện có theo thứ tự hàng, số ghế
+        migrations.RunSQL(
+            sql="""
+                UPDATE seats s
+                SET position = p.position
+                FROM (
+                    SELECT o.id, ROW_NUMBER() OVER (
+                        PARTITION BY o.screen_id ORDER BY o.row, o.number
+                    ) - 1 AS position
+                    FROM seats o
+                ) p
+                WHERE s.id = p.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='seat',
+            name='position',
+            field=models.IntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='seat',
+            constraint=models.UniqueConstraint(fields=('screen', 'position'), name='unique_seat_position'),
+        ),
+        migrations.AddField(
+            model_name='showtime',
+            name='seat_bitmap',
+            field=models.BinaryField(default=bytes, editable=False),
+        ),
+        migrations.RunPython(build_seat_bitmaps, migrations.RunPython.noop),
+    ]
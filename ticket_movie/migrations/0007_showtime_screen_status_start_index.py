@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0006_seat_position_showtime_seat_bitmap'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='showtime',
+            name='idx_showtime_screen',
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['screen', 'status', 'start_time'], name='idx_showtime_screen_status'),
+        ),
+    ]
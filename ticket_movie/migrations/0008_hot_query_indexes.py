@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0007_showtime_screen_status_start_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='idx_booking_showtime',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['showtime', 'status'], name='idx_booking_showtime_status'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingseat',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['booking'], name='idx_bookingseat_active_booking'),
+        ),
+        migrations.AddIndex(
+            model_name='promotion',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['end_date', 'start_date'], name='idx_promotion_active_window'),
+        ),
+    ]
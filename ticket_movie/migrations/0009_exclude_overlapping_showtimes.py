@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:44
+
+import django.contrib.postgres.constraints
+import ticket_movie.models
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+def cancel_overlapping_showtimes(apps, schema_editor):
+    """
+    Dữ liệu cũ có thể đã có suất chiếu chồng giờ trong cùng phòng: giữ suất bắt đầu
+    trước, huỷ suất sau nếu chưa có ai giữ ghế. Suất sau đã bán vé thì không tự huỷ
+    được, migration dừng lại và liệt kê các cặp cần xử lý tay.
+    """
+    Showtime = apps.get_model('ticket_movie', 'Showtime')
+    BookingSeat = apps.get_model('ticket_movie', 'BookingSeat')
+    showtimes = Showtime.objects.exclude(status='cancelled').order_by(
+        'screen_id', 'start_time', 'id').values_list('id', 'screen_id', 'start_time', 'end_time')
+    booked = set(BookingSeat.objects.filter(is_active=True).values_list(
+        'showtime_id', flat=True).distinct())
+
+    cancelled, conflicts = [], []
+    kept = None
+    for showtime in showtimes:
+        showtime_id, screen_id, start_time, end_time = showtime
+        if kept is None or kept[1] != screen_id or start_time >= kept[3]:
+            kept = showtime
+        elif showtime_id in booked:
+            conflicts.append((screen_id, kept[0], kept[2], kept[3], showtime_id, start_time, end_time))
+        else:
+            cancelled.append(showtime_id)
+    if conflicts:
+        report = '\n'.join(
+            f'  screen {screen_id}: showtime {first} ({first_start} - {first_end}) overlaps '
+            f'showtime {second} ({second_start} - {second_end}) which has bookings'
+            for screen_id, first, first_start, first_end, second, second_start, second_end in conflicts)
+        raise RuntimeError(
+            'Overlapping showtimes must be resolved before adding '
+            f'exclude_overlapping_showtimes:\n{report}')
+    Showtime.objects.filter(id__in=cancelled).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        # Cần btree_gist để so sánh bằng screen_id trong index GiST
+        BtreeGistExtension(),
+        migrations.RunPython(cancel_overlapping_showtimes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='showtime',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(('status', 'cancelled'), _negated=True),
+                expressions=[
+                    ('screen', '='),
+                    (ticket_movie.models.TsTzRange('start_time', 'end_time'), '&&'),
+                ],
+                name='exclude_overlapping_showtimes',
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Index cho bảng của rest_framework_simplejwt.token_blacklist:
+    # prune_tokens lọc theo expires_at, Bloom filter nạp token mới theo blacklisted_at
+
+    dependencies = [
+        ('ticket_movie', '0009_exclude_overlapping_showtimes'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS idx_outstandingtoken_expires_at '
+            'ON public.token_blacklist_outstandingtoken (expires_at)',
+            'DROP INDEX IF EXISTS public.idx_outstandingtoken_expires_at',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS idx_blacklistedtoken_blacklisted_at '
+            'ON public.token_blacklist_blacklistedtoken (blacklisted_at)',
+            'DROP INDEX IF EXISTS public.idx_blacklistedtoken_blacklisted_at',
+        ),
+    ]
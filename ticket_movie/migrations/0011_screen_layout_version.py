@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0010_token_blacklist_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screen',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:02
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _count(queryset, group_field):
+    return Coalesce(Subquery(
+        queryset.order_by().values(group_field).annotate(c=Count('id')).values('c')
+    ), Value(0))
+
+
+def reconcile_available_seats(apps, schema_editor):
+    """
+    Giống ticket_movie.booking.reconcile_available_seats cho mọi suất chiếu: code đặt vé
+    cũ không cập nhật available_seats nên giá trị đang lưu có thể lệch, và lần trừ ghế có
+    điều kiện đầu tiên sẽ báo hết ghế dù suất chiếu còn trống.
+    """
+    Seat = apps.get_model('ticket_movie', 'Seat')
+    BookingSeat = apps.get_model('ticket_movie', 'BookingSeat')
+    Showtime = apps.get_model('ticket_movie', 'Showtime')
+    Showtime.objects.update(available_seats=Greatest(
+        _count(Seat.objects.filter(screen_id=OuterRef('screen_id'), is_active=True), 'screen_id')
+        - _count(BookingSeat.objects.filter(showtime_id=OuterRef('id'), is_active=True),
+                 'showtime_id'),
+        Value(0),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket_movie', '0011_screen_layout_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconcile_available_seats, migrations.RunPython.noop),
+    ]
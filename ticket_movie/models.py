@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import MinValueValidator
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 
 
 class UserManager(BaseUserManager):
@@ -24,7 +26,9 @@ class UserManager(BaseUserManager):
 
     def create_social_user(self, provider, social_id, email=None, **extra_fields):
         """
-        Tạo social user với provider và social_id
+        Tạo social user với provider và social_id, hoặc cập nhật thông tin nếu đã có.
+        Username provider_social_id là unique nên khi nhiều request đăng nhập lần
+        đầu cùng lúc chỉ 1 request tạo được user, các request còn lại dùng user đó.
         """
         if not provider or not social_id:
             raise ValueError(
@@ -32,21 +36,37 @@ class UserManager(BaseUserManager):
 
         # Tạo username duy nhất từ social info
         username = f"{provider}_{social_id}"
+        extra_fields.pop('username', None)
         email = self.normalize_email(email) if email else None
 
-        # Kiểm tra xem username đã tồn tại chưa
-        if self.model.objects.filter(username=username).exists():
-            raise ValueError('Username đã tồn tại cho social user này')
-
-        user = self.model(
-            username=username,
-            email=email,
-            provider=provider,
-            social_id=social_id,
-            **extra_fields
-        )
-        user.set_unusable_password()  # Social user không dùng password
-        user.save(using=self._db)
+        user = self.filter(username=username).first()
+        if user is None:
+            user = self.model(
+                username=username,
+                email=email,
+                provider=provider,
+                social_id=social_id,
+                **extra_fields
+            )
+            user.set_unusable_password()  # Social user không dùng password
+            try:
+                with transaction.atomic(using=self._db):
+                    user.save(using=self._db)
+                return user
+            except IntegrityError:
+                # Request khác vừa tạo user này; lỗi do trùng email thì vẫn báo lỗi
+                user = self.filter(username=username).first()
+                if user is None:
+                    raise
+
+        # Cập nhật thông tin mới từ provider, bỏ qua giá trị rỗng
+        profile = {'email': email, **extra_fields}
+        for field in self.model.SOCIAL_PROFILE_FIELDS:
+            if profile.get(field):
+                setattr(user, field, profile[field])
+        dirty_fields = user.get_dirty_fields()
+        if dirty_fields:
+            user.save(using=self._db, update_fields=dirty_fields)
         return user
 
     def create_superuser(self, email, password, **extra_fields):
@@ -141,6 +161,11 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    # Các trường clean() kiểm tra, đổi trường khác thì không cần chạy lại clean()
+    IDENTITY_FIELDS = {'email', 'provider', 'social_id'}
+    # Các trường lấy theo thông tin mới nhất từ provider mỗi lần social login
+    SOCIAL_PROFILE_FIELDS = ('email', 'full_name', 'avatar')
+
     class Meta:
         db_table = 'users'
         verbose_name = _('user')
@@ -150,23 +175,71 @@ class User(AbstractUser):
         return self.email or f"{self.provider}:{self.social_id}"
 
     def clean(self):
+        email = self.email
         super().clean()
+        # AbstractBaseUser.clean ghi get_username() (username với social user) vào email nên
+        # đặt lại giá trị ban đầu: chỉ chuẩn hoá email có giá trị, None giữ nguyên là None
+        # (không đổi thành chuỗi rỗng) vì email unique và nhiều social user không có email
+        self.email = self.__class__.objects.normalize_email(email) if email else email
         # Kiểm tra xem user có email hoặc là social user không
         if not self.email and not (self.provider and self.social_id):
             raise ValidationError(
                 'User must have either email or social credentials')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giá trị lúc tải từ DB, dùng để biết trường nào thực sự thay đổi khi save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_dirty_fields(self):
+        """Các trường đã đổi so với DB (mọi trường nếu user chưa được tải từ DB)"""
+        fields = [f.attname for f in self._meta.concrete_fields if not f.primary_key]
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return fields
+        return [
+            name for name in fields
+            if (name in loaded and getattr(self, name) != loaded[name])
+            or (name not in loaded and name in self.__dict__)
+        ]
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        # Giá trị vừa đọc lại là giá trị mới trong DB, không phải thay đổi cần ghi
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None:
+            for field in self._meta.concrete_fields:
+                refreshed = (fields is None or field.name in fields or field.attname in fields)
+                if refreshed and field.attname in self.__dict__:
+                    loaded[field.attname] = getattr(self, field.attname)
+
     def save(self, *args, **kwargs):
-        # Validate password nếu có thay đổi và là regular user
-        if not self.is_social_user and self.password and not self.check_password(self.password):
+        update_fields = kwargs.get('update_fields')
+        saved_fields = (set(update_fields) if update_fields is not None
+                        else set(self.get_dirty_fields()))
+        # User đã tải từ DB chỉ ghi các trường đã đổi, không đổi gì thì không có UPDATE
+        if (update_fields is None and not self._state.adding and not kwargs.get('force_insert')
+                and getattr(self, '_loaded_values', None) is not None):
+            kwargs['update_fields'] = saved_fields
+
+        # Chỉ validate khi đang đặt mật khẩu mới: set_password giữ mật khẩu thô ở _password
+        if self._password is not None and 'password' in saved_fields and not self.is_social_user:
             try:
-                validate_password(self.password)
+                validate_password(self._password, self)
             except ValidationError as e:
                 raise ValidationError({'password': e.messages})
 
-        self.clean()
+        if saved_fields & self.IDENTITY_FIELDS:
+            self.clean()
         super().save(*args, **kwargs)
 
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}),
+            **{name: getattr(self, name) for name in saved_fields if name in self.__dict__},
+        }
+
     @property
     def is_social_user(self):
         """Kiểm tra có phải là social user không"""
@@ -270,6 +343,8 @@ class Screen(models.Model):
     )
     capacity = models.IntegerField(
         null=False, validators=[MinValueValidator(1)])
+    # Tăng mỗi khi ghế của phòng chiếu thay đổi, là 1 phần khoá cache sơ đồ ghế
+    layout_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         db_table = 'screens'
@@ -280,6 +355,16 @@ class Screen(models.Model):
     def __str__(self):
         return f"{self.name} ({self.type}) - {self.cinema.name}"
 
+    def save(self, *args, **kwargs):
+        # layout_version chỉ được tăng bằng UPDATE (seat_layout.invalidate_layout),
+        # không ghi đè bằng giá trị cũ đang có trong instance
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'layout_version'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Seat(models.Model):
     class SeatType(models.TextChoices):
@@ -296,6 +381,9 @@ class Seat(models.Model):
         default=SeatType.STANDARD
     )
     is_active = models.BooleanField(default=True)
+    # Vị trí cố định của ghế trong phòng chiếu, dùng làm chỉ số bit
+    # trong bitmap ghế đã đặt của suất chiếu (Showtime.seat_bitmap)
+    position = models.IntegerField(null=False, editable=False)
 
     class Meta:
         db_table = 'seats'
@@ -306,12 +394,34 @@ class Seat(models.Model):
             models.UniqueConstraint(
                 fields=['screen', 'row', 'number'],
                 name='unique_seat'
+            ),
+            models.UniqueConstraint(
+                fields=['screen', 'position'],
+                name='unique_seat_position'
             )
         ]
 
     def __str__(self):
         return f"{self.row}{self.number} ({self.type})"
 
+    def save(self, *args, **kwargs):
+        # Ghế mới nhận vị trí tiếp theo trong phòng chiếu, không bao giờ đổi lại
+        if self.position is None:
+            with transaction.atomic():
+                # Khoá phòng chiếu để 2 ghế thêm đồng thời không nhận cùng 1 vị trí
+                list(Screen.objects.select_for_update().filter(id=self.screen_id).values_list('id'))
+                last = Seat.objects.filter(screen_id=self.screen_id).aggregate(
+                    models.Max('position'))['position__max']
+                self.position = 0 if last is None else last + 1
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
 
 class Showtime(models.Model):
     class ShowStatus(models.TextChoices):
@@ -331,18 +441,32 @@ class Showtime(models.Model):
         choices=ShowStatus.choices,
         default=ShowStatus.SCHEDULED
     )
+    # Bit thứ i bật khi ghế có Seat.position = i đã được đặt
+    seat_bitmap = models.BinaryField(default=bytes, editable=False)
 
     class Meta:
         db_table = 'showtimes'
         indexes = [
             models.Index(fields=['movie'], name='idx_showtime_movie'),
-            models.Index(fields=['screen'], name='idx_showtime_screen'),
+            # Lọc lịch chiếu theo phòng chiếu + trạng thái + khoảng thời gian
+            models.Index(fields=['screen', 'status', 'start_time'],
+                         name='idx_showtime_screen_status'),
         ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(end_time__gt=models.F('start_time')),
                 name='valid_showtime'
-            )
+            ),
+            # Hai suất chiếu chưa huỷ của cùng phòng chiếu không được chồng giờ nhau.
+            # Khoảng dọn phòng (SHOWTIME_CLEANING_BUFFER) được kiểm tra ở showtime_overlap
+            ExclusionConstraint(
+                name='exclude_overlapping_showtimes',
+                expressions=[
+                    ('screen', RangeOperators.EQUAL),
+                    (TsTzRange('start_time', 'end_time'), RangeOperators.OVERLAPS),
+                ],
+                condition=~models.Q(status='cancelled'),
+            ),
         ]
 
     def __str__(self):
@@ -368,12 +492,20 @@ class Booking(models.Model):
         choices=BookingStatus.choices,
         default=BookingStatus.PENDING
     )
+    # Thời điểm hết hạn giữ ghế của booking PENDING
+    expires_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'bookings'
         indexes = [
             models.Index(fields=['user'], name='idx_booking_user'),
-            models.Index(fields=['showtime'], name='idx_booking_showtime'),
+            models.Index(fields=['showtime', 'status'],
+                         name='idx_booking_showtime_status'),
+            models.Index(
+                fields=['expires_at'],
+                name='idx_booking_pending_expiry',
+                condition=models.Q(status='pending')
+            ),
         ]
 
     def __str__(self):
@@ -382,11 +514,31 @@ class Booking(models.Model):
 
 class BookingSeat(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, null=False)
+    # Lưu trùng showtime để DB tự chặn 2 booking giữ cùng 1 ghế
+    showtime = models.ForeignKey(
+        Showtime, on_delete=models.CASCADE, null=False)
     seat = models.ForeignKey(Seat, on_delete=models.CASCADE, null=False)
     price = models.DecimalField(max_digits=10, decimal_places=2, null=False)
+    # False khi booking bị huỷ/hết hạn, ghế được trả lại cho suất chiếu
+    is_active = models.BooleanField(default=True)
 
     class Meta:
         db_table = 'booking_seats'
+        indexes = [
+            # Trả ghế khi huỷ/hết hạn chỉ quan tâm các dòng còn giữ ghế
+            models.Index(
+                fields=['booking'],
+                name='idx_bookingseat_active_booking',
+                condition=models.Q(is_active=True)
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['showtime', 'seat'],
+                condition=models.Q(is_active=True),
+                name='unique_active_showtime_seat'
+            )
+        ]
 
     def __str__(self):
         return f"{self.seat} in {self.booking}"
@@ -461,6 +613,14 @@ class Promotion(models.Model):
 
     class Meta:
         db_table = 'promotions'
+        indexes = [
+            # Tra theo mã đã có unique index trên code, index này cho danh sách mã đang hiệu lực
+            models.Index(
+                fields=['end_date', 'start_date'],
+                name='idx_promotion_active_window',
+                condition=models.Q(is_active=True)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.code})"
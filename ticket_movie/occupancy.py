@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from ticket_movie.models import BookingSeat, Showtime
+
+
+def set_bits(bitmap, positions, occupied=True):
+    """Trả về bitmap mới với các bit tại positions được bật/tắt"""
+    data = bytearray(bitmap)
+    for position in positions:
+        index, mask = divmod(position, 8)
+        if index >= len(data):
+            if not occupied:
+                continue
+            data.extend(b'\x00' * (index + 1 - len(data)))
+        if occupied:
+            data[index] |= 1 << mask
+        else:
+            data[index] &= ~(1 << mask) & 0xFF
+    # Bỏ các byte 0 ở cuối để bitmap luôn ở dạng ngắn nhất
+    return bytes(data).rstrip(b'\x00')
+
+
+def is_set(bitmap, position):
+    index, mask = divmod(position, 8)
+    return index < len(bitmap) and bool(bitmap[index] & (1 << mask))
+
+
+def count_bits(bitmap):
+    return int.from_bytes(bitmap, 'little').bit_count()
+
+
+def build_bitmap(positions):
+    return set_bits(b'', positions)
+
+
+def get_bitmap(showtime_id):
+    bitmap = Showtime.objects.filter(id=showtime_id).values_list(
+        'seat_bitmap', flat=True).first()
+    return bytes(bitmap or b'')
+
+
+async def aget_bitmap(showtime_id):
+    bitmap = await Showtime.objects.filter(id=showtime_id).values_list(
+        'seat_bitmap', flat=True).afirst()
+    return bytes(bitmap or b'')
+
+
+def occupied_count(showtime_id):
+    return count_bits(get_bitmap(showtime_id))
+
+
+def mark_seats(showtime_id, positions, occupied=True):
+    """
+    Cập nhật bitmap của suất chiếu trong transaction hiện tại.
+    Khoá dòng showtime để các booking song song không ghi đè bitmap của nhau.
+    """
+    with transaction.atomic():
+        bitmap = Showtime.objects.select_for_update().filter(
+            id=showtime_id).values_list('seat_bitmap', flat=True).get()
+        Showtime.objects.filter(id=showtime_id).update(
+            seat_bitmap=set_bits(bytes(bitmap), positions, occupied))
+
+
+def active_positions(showtime_ids):
+    """Tính lại vị trí ghế đã đặt từ booking_seats, theo từng suất chiếu"""
+    positions = defaultdict(list)
+    rows = BookingSeat.objects.filter(
+        showtime_id__in=showtime_ids, is_active=True
+    ).values_list('showtime_id', 'seat__position')
+    for showtime_id, position in rows.iterator():
+        positions[showtime_id].append(position)
+    return positions
+
+
+def rebuild_bitmaps(showtime_ids, apply=True):
+    """
+    So sánh bitmap đang lưu với dữ liệu gốc trong booking_seats.
+    Trả về danh sách id suất chiếu bị lệch; apply=True thì ghi đè bitmap đúng.
+    """
+    showtime_ids = list(showtime_ids)
+    expected = active_positions(showtime_ids)
+    drifted = []
+    stored = Showtime.objects.filter(id__in=showtime_ids).values_list('id', 'seat_bitmap')
+    for showtime_id, bitmap in stored.iterator():
+        if bytes(bitmap) != build_bitmap(expected.get(showtime_id, [])):
+            drifted.append(showtime_id)
+
+    if apply:
+        for showtime_id in drifted:
+            # Khoá suất chiếu rồi tính lại để không ghi đè booking vừa xảy ra
+            with transaction.atomic():
+                list(Showtime.objects.select_for_update().filter(id=showtime_id).values_list('id'))
+                correct = build_bitmap(active_positions([showtime_id]).get(showtime_id, []))
+                Showtime.objects.filter(id=showtime_id).update(seat_bitmap=correct)
+    return drifted
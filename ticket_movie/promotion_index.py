@@ -0,0 +1,126 @@
+"""
+Chỉ mục trong bộ nhớ của các Promotion đang hoạt động, dùng để tìm mã giảm
+giá tốt nhất cho giỏ hàng khi checkout mà không phải quét bảng promotions.
+
+Promotion được chia theo ngày (trong HORIZON_DAYS tới) và theo loại giảm giá,
+mỗi nhóm sắp xếp giảm dần theo discount_value nên chỉ cần duyệt tới mã hợp lệ
+đầu tiên. Chỉ mục dựng lại khi promotion thay đổi (qua phiên bản trong cache)
+hoặc sau settings.PROMOTION_INDEX_TTL giây.
+"""
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ticket_movie.catalog_cache import bump_cache_version, get_cache_version
+from ticket_movie.models import Promotion
+from ticket_movie.promotions import (
+    PromotionError, booking_order_value, compute_discount, redeem_promotion
+)
+
+VERSION_KEY = 'promotions:version'
+HORIZON_DAYS = 7
+
+
+class PromotionIndex:
+    def __init__(self, promotions, now):
+        self.built_at = now
+        self.day_starts = [now + timedelta(days=day) for day in range(HORIZON_DAYS + 1)]
+        self.buckets = [defaultdict(list) for _ in range(HORIZON_DAYS)]
+        for promotion in promotions:
+            for day in range(HORIZON_DAYS):
+                day_start, day_end = self.day_starts[day], self.day_starts[day + 1]
+                if promotion.start_date < day_end and promotion.end_date >= day_start:
+                    self.buckets[day][promotion.discount_type].append(promotion)
+        for bucket in self.buckets:
+            for promotions in bucket.values():
+                promotions.sort(key=lambda promotion: promotion.discount_value, reverse=True)
+
+    def covers(self, now):
+        return self.day_starts[0] <= now < self.day_starts[-1]
+
+    def candidates(self, order_value, now, per_type=3):
+        """Vài mã tốt nhất của từng loại giảm giá áp được cho đơn hàng, tốt nhất đứng đầu"""
+        day = bisect_right(self.day_starts, now) - 1
+        best = []
+        for promotions in self.buckets[day].values():
+            found = 0
+            for promotion in promotions:
+                if not (promotion.start_date <= now <= promotion.end_date):
+                    continue
+                if promotion.min_order_value is not None and order_value < promotion.min_order_value:
+                    continue
+                if promotion.max_uses is not None and promotion.current_uses >= promotion.max_uses:
+                    continue
+                best.append((compute_discount(promotion, order_value), promotion))
+                found += 1
+                if found == per_type:
+                    break
+        best.sort(key=lambda item: item[0], reverse=True)
+        return best
+
+
+_index = None
+_index_version = None
+_index_loaded = 0.0
+_lock = threading.Lock()
+
+
+def invalidate_promotion_index():
+    bump_cache_version(VERSION_KEY)
+
+
+def get_index(now=None):
+    global _index, _index_version, _index_loaded
+    now = now or timezone.now()
+    version = get_cache_version(VERSION_KEY)
+    with _lock:
+        if (_index is None or _index_version != version or not _index.covers(now)
+                or time.monotonic() - _index_loaded > settings.PROMOTION_INDEX_TTL):
+            promotions = Promotion.objects.filter(
+                is_active=True, end_date__gte=now,
+                start_date__lt=now + timedelta(days=HORIZON_DAYS))
+            _index = PromotionIndex(list(promotions), now)
+            _index_version = version
+            _index_loaded = time.monotonic()
+        return _index
+
+
+def promotion_breakdown(promotion, discount, order_value):
+    return {
+        'code': promotion.code,
+        'name': promotion.name,
+        'discount_type': promotion.discount_type,
+        'discount_value': promotion.discount_value,
+        'min_order_value': promotion.min_order_value,
+        'order_value': order_value,
+        'discount_amount': discount,
+        'final_amount': order_value - discount,
+    }
+
+
+def best_promotions(order_value, now=None):
+    """Danh sách (số tiền giảm, promotion) áp được cho đơn hàng, tốt nhất trước"""
+    now = now or timezone.now()
+    return get_index(now).candidates(order_value, now)
+
+
+def apply_best_promotion(booking, now=None):
+    """
+    Áp mã tốt nhất cho booking, xếp hạng theo giá ghế ở server (không theo
+    total_amount client gửi). Chỉ mục có thể chưa biết mã vừa hết lượt,
+    khi đó thử tiếp mã kế tiếp; trả về None nếu không mã nào áp được.
+    """
+    order_value = booking_order_value(booking)
+    for _, promotion in best_promotions(order_value, now):
+        try:
+            with transaction.atomic():
+                return redeem_promotion(booking, promotion.code, now, order_value)
+        except PromotionError:
+            continue
+    return None
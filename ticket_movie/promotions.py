@@ -0,0 +1,77 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from ticket_movie.models import AppliedPromotion, Booking, BookingSeat, Promotion
+
+
+class PromotionError(Exception):
+    """Mã khuyến mãi không dùng được cho booking này"""
+
+
+def compute_discount(promotion, order_value):
+    """Số tiền giảm của promotion cho đơn hàng, không vượt quá giá trị đơn"""
+    if promotion.discount_type == Promotion.DiscountType.PERCENTAGE:
+        discount = (order_value * promotion.discount_value / 100).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP)
+    else:
+        discount = promotion.discount_value
+    return min(discount, order_value)
+
+
+def active_promotions(now=None):
+    now = now or timezone.now()
+    return Promotion.objects.filter(is_active=True, start_date__lte=now, end_date__gte=now)
+
+
+def booking_order_value(booking):
+    """Giá trị đơn hàng tính ở server: tổng giá các ghế của booking (BookingSeat.price)"""
+    return BookingSeat.objects.filter(booking_id=booking.id).aggregate(
+        total=Sum('price'))['total'] or Decimal('0')
+
+
+def redeem_promotion(booking, code, now=None, order_value=None):
+    """
+    Áp mã khuyến mãi cho booking. Lượt dùng được tăng bằng 1 câu UPDATE có điều kiện
+    nên không bao giờ vượt max_uses khi nhiều người dùng cùng lúc. Chạy trong
+    transaction của booking: booking lỗi thì lượt dùng và AppliedPromotion cũng rollback.
+
+    min_order_value và số tiền giảm tính theo giá ghế ở server, không theo
+    total_amount client gửi lên; total_amount được ghi lại bằng giá ghế trừ giảm giá.
+    """
+    now = now or timezone.now()
+    if order_value is None:
+        order_value = booking_order_value(booking)
+    with transaction.atomic():
+        promotion = active_promotions(now).filter(code=code).first()
+        if promotion is None:
+            raise PromotionError('Invalid or expired promotion code')
+        if promotion.min_order_value is not None and order_value < promotion.min_order_value:
+            raise PromotionError('Order value is below the minimum for this promotion')
+        if AppliedPromotion.objects.filter(booking=booking).exists():
+            raise PromotionError('A promotion has already been applied to this booking')
+
+        redeemed = active_promotions(now).filter(id=promotion.id).filter(
+            Q(max_uses__isnull=True) | Q(current_uses__lt=F('max_uses'))
+        ).update(current_uses=F('current_uses') + 1)
+        if not redeemed:
+            raise PromotionError('Promotion usage limit reached')
+
+        discount = compute_discount(promotion, order_value)
+        applied = AppliedPromotion.objects.create(
+            booking=booking, promotion=promotion, discount_amount=discount)
+        booking.total_amount = order_value - discount
+        Booking.objects.filter(id=booking.id).update(total_amount=booking.total_amount)
+    return applied
+
+
+def release_promotions(booking_ids):
+    """Trả lại lượt dùng mã của các booking bị huỷ/hết hạn"""
+    usages = AppliedPromotion.objects.filter(booking_id__in=booking_ids).values(
+        'promotion_id').annotate(uses=Count('id')).order_by('promotion_id')
+    for usage in usages:
+        Promotion.objects.filter(
+            id=usage['promotion_id'], current_uses__gte=usage['uses']
+        ).update(current_uses=F('current_uses') - usage['uses'])
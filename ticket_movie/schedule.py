@@ -0,0 +1,74 @@
+from django.db import connection
+
+# Gom nhóm phim → phòng chiếu → suất chiếu ngay trong PostgreSQL,
+# trả về sẵn 1 chuỗi JSON để view gửi thẳng cho client
+SCHEDULE_SQL = """
+    WITH st AS (
+        SELECT s.id, s.movie_id, s.screen_id, s.start_time, s.end_time, s.base_price
+        FROM public.showtimes s
+        JOIN public.screens sc ON sc.id = s.screen_id
+        WHERE sc.cinema_id = ANY(%(cinema_ids)s)
+          AND s.status = 'scheduled'
+          AND s.start_time > %(now)s
+          AND s.start_time >= %(start)s
+          AND s.start_time < %(end)s
+    ),
+    by_screen AS (
+        SELECT
+            st.movie_id,
+            st.screen_id,
+            json_agg(json_build_object(
+                'showtime_id', st.id,
+                'start_time', st.start_time,
+                'end_time', st.end_time,
+                'base_price', st.base_price::float
+            ) ORDER BY st.start_time) AS showtimes
+        FROM st
+        GROUP BY st.movie_id, st.screen_id
+    ),
+    by_movie AS (
+        SELECT
+            m.release_date,
+            json_build_object(
+                'movie', json_build_object(
+                    'id', m.id,
+                    'title', m.title,
+                    'genre', m.genre,
+                    'status', m.status,
+                    'duration', m.duration,
+                    'poster_url', m.poster_url,
+                    'rating', m.rating,
+                    'director', m.director,
+                    'release_date', m.release_date,
+                    'trailer_url', m.trailer_url
+                ),
+                'screens', json_agg(json_build_object(
+                    'cinema_id', c.id,
+                    'cinema_name', c.name,
+                    'screen_id', sc.id,
+                    'screen_name', sc.name,
+                    'screen_type', sc.type,
+                    'showtimes', bs.showtimes
+                ) ORDER BY c.id, sc.id)
+            ) AS item
+        FROM by_screen bs
+        JOIN public.movies m ON m.id = bs.movie_id
+        JOIN public.screens sc ON sc.id = bs.screen_id
+        JOIN public.cinemas c ON c.id = sc.cinema_id
+        GROUP BY m.id
+    )
+    SELECT COALESCE(json_agg(item ORDER BY release_date), '[]'::json)::text
+    FROM by_movie
+"""
+
+
+def schedule_json(cinema_ids, start, end, now):
+    """Lịch chiếu của nhiều rạp trong khoảng [start, end), dạng chuỗi JSON"""
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEDULE_SQL, {
+            'cinema_ids': list(cinema_ids),
+            'start': start,
+            'end': end,
+            'now': now,
+        })
+        return cursor.fetchone()[0]
@@ -0,0 +1,292 @@
+import string
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ticket_movie.booking import reconcile_available_seats
+from ticket_movie.db_router import aread_from_replica, pin_to_primary, read_from_replica
+from ticket_movie.models import BookingSeat, Screen, Seat, Showtime
+from ticket_movie.occupancy import aget_bitmap, get_bitmap, is_set
+
+CACHE_KEY = 'seat_layout:{screen_id}:{version}'
+# Scope ghim về primary sau khi sơ đồ ghế thay đổi (ticket_movie/db_router.py)
+PIN_SCOPE = 'seat_layout:{screen_id}'
+
+
+def layout_seats(screen_id):
+    return Seat.objects.filter(screen_id=screen_id).order_by('row', 'number').values(
+        'id', 'screen_id', 'row', 'number', 'type', 'is_active', 'position')
+
+
+def build_layout(screen_id):
+    """
+    Tính sơ đồ ghế của phòng chiếu: tên ghế, số ghế đôi, lưới hàng/cột.
+    Kết quả không phụ thuộc suất chiếu nên được cache theo phòng chiếu.
+    """
+    return layout_from_seats(layout_seats(screen_id))
+
+
+async def abuild_layout(screen_id):
+    return layout_from_seats([seat async for seat in layout_seats(screen_id)])
+
+
+def layout_from_seats(seats):
+    rows = {}
+    positions = {}
+    max_number = 0
+    for seat in seats:
+        positions[seat['id']] = seat.pop('position')
+        row = rows.setdefault(seat['row'], {'seats': {}, 'index': 0})
+        # Ghế đôi chiếm 2 số, tên ghế đánh theo vị trí thực tế trong hàng
+        is_couple = seat['type'] == Seat.SeatType.COUPLE
+        row['index'] += 2 if is_couple else 1
+        seat_index = row['index'] - 1 if is_couple else row['index']
+        seat['seat_name'] = f"{seat['row']}{seat_index}"
+        seat['seat_name_couple'] = f"{seat['row']}{seat_index + 1}" if is_couple else None
+        row['seats'][seat['number']] = seat
+        max_number = max(max_number, seat['number'])
+
+    grid = []
+    for row_label in sorted(rows.keys()):
+        row_seats = rows[row_label]['seats']
+        row_data = []
+        seat_couple = False
+        for num in range(1, max_number + 1):
+            if num in row_seats:
+                if row_seats[num]['type'] == Seat.SeatType.COUPLE:
+                    seat_couple = True
+                row_data.append(row_seats[num])
+            elif seat_couple:
+                # Ô trống ngay sau ghế đôi là nửa còn lại của ghế đó
+                seat_couple = False
+            else:
+                row_data.append(False)
+        grid.append(row_data)
+
+    return {
+        'grid': grid,
+        'positions': positions,
+        'max_number': max_number,
+        'max_row': len(rows),
+    }
+
+
+def layout_version(screen_id):
+    return Screen.objects.filter(id=screen_id).values_list('layout_version', flat=True)
+
+
+def get_layout(screen_id):
+    """
+    Sơ đồ ghế đã cache. Khoá cache gồm Screen.layout_version đọc từ DB (1 truy vấn
+    theo khoá chính) nên mọi worker thấy sơ đồ mới ngay khi ghế thay đổi,
+    không phụ thuộc cache có dùng chung giữa các worker hay không.
+    """
+    key = CACHE_KEY.format(screen_id=screen_id, version=layout_version(screen_id).first())
+    layout = cache.get(key)
+    if layout is None:
+        # Sơ đồ ghế đọc từ replica; bitmap ghế đã đặt luôn đọc từ primary
+        with read_from_replica(PIN_SCOPE.format(screen_id=screen_id)):
+            layout = build_layout(screen_id)
+        cache.set(key, layout, settings.SEAT_LAYOUT_CACHE_TIMEOUT)
+    return layout
+
+
+async def aget_layout(screen_id):
+    key = CACHE_KEY.format(screen_id=screen_id, version=await layout_version(screen_id).afirst())
+    layout = await cache.aget(key)
+    if layout is None:
+        async with aread_from_replica(PIN_SCOPE.format(screen_id=screen_id)):
+            layout = await abuild_layout(screen_id)
+        await cache.aset(key, layout, settings.SEAT_LAYOUT_CACHE_TIMEOUT)
+    return layout
+
+
+def invalidate_layout(screen_id):
+    # Bản cache của phiên bản cũ không còn được đọc và tự hết hạn. capacity luôn
+    # bằng số ghế đang hoạt động, phòng chưa có ghế giữ capacity đã nhập
+    active_seats = Seat.objects.filter(screen_id=OuterRef('id'), is_active=True).order_by(
+        ).values('screen_id').annotate(c=Count('id')).values('c')
+    Screen.objects.filter(id=screen_id).update(
+        layout_version=F('layout_version') + 1,
+        capacity=Coalesce(Subquery(active_seats), F('capacity')))
+    pin_to_primary(PIN_SCOPE.format(screen_id=screen_id))
+
+
+def render_seat_map(screen_id, showtime_id):
+    """Ghép sơ đồ ghế đã cache với bitmap ghế đã đặt của suất chiếu"""
+    return overlay_bitmap(get_layout(screen_id), get_bitmap(showtime_id))
+
+
+async def arender_seat_map(screen_id, showtime_id):
+    return overlay_bitmap(await aget_layout(screen_id), await aget_bitmap(showtime_id))
+
+
+def overlay_bitmap(layout, bitmap):
+    positions = layout['positions']
+    data = [
+        [
+            # is_booking = True nghĩa là ghế còn trống (giữ nguyên ý nghĩa API cũ)
+            {**seat, 'is_booking': not is_set(bitmap, positions[seat['id']])} if seat else False
+            for seat in row
+        ]
+        for row in layout['grid']
+    ]
+    return {
+        'data': data,
+        'max_number': layout['max_number'],
+        'max_row': layout['max_row'],
+    }
+
+
+ROW_LABELS = string.ascii_uppercase
+
+
+def _parse_rows(value, rows):
+    """'*', 'A', 'A-C', 'A,C,E-F' hoặc list các giá trị đó → tập nhãn hàng"""
+    if value in (None, '*'):
+        return set(rows)
+    parts = value if isinstance(value, list) else str(value).split(',')
+    result = set()
+    for part in parts:
+        part = str(part).strip().upper()
+        start, _, end = part.partition('-')
+        if start not in rows or (end and end not in rows):
+            raise ValueError(f"Unknown row '{part}'")
+        result.update(rows[rows.index(start):rows.index(end or start) + 1])
+    return result
+
+
+def _parse_numbers(value, seats_per_row):
+    """'*', 5, '3-10', '1,2,8-9' hoặc list các giá trị đó → tập số ghế"""
+    if value in (None, '*'):
+        return set(range(1, seats_per_row + 1))
+    parts = value if isinstance(value, list) else str(value).split(',')
+    result = set()
+    for part in parts:
+        start, _, end = str(part).strip().partition('-')
+        if not start.isdigit() or (end and not end.isdigit()):
+            raise ValueError(f"Invalid seat numbers '{part}'")
+        start, end = int(start), int(end or start)
+        if not 1 <= start <= end <= seats_per_row:
+            raise ValueError(f"Seat numbers '{part}' out of range 1-{seats_per_row}")
+        result.update(range(start, end + 1))
+    return result
+
+
+def build_seat_plan(spec):
+    """
+    Dựng danh sách ghế {(row, number): type} từ mô tả sơ đồ gọn, ví dụ:
+    {"rows": 10, "seats_per_row": 14,
+     "vip": [{"rows": "E-H", "numbers": "3-12"}],
+     "couple": [{"rows": "J"}],
+     "gaps": [{"rows": "*", "numbers": "7"}]}
+    Ghế đôi ở số n chiếm luôn chỗ n+1 (giống cách SeatsScreen dựng lưới) nên n+1 phải
+    nằm trong seats_per_row.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError('Layout must be an object')
+    rows = spec.get('rows')
+    if isinstance(rows, int):
+        if not 1 <= rows <= len(ROW_LABELS):
+            raise ValueError(f'Layout supports 1 to {len(ROW_LABELS)} rows')
+        rows = list(ROW_LABELS[:rows])
+    elif isinstance(rows, list) and rows:
+        rows = [str(row).upper() for row in rows]
+        if any(len(row) != 1 for row in rows) or len(set(rows)) != len(rows):
+            raise ValueError('Row labels must be unique single characters')
+    else:
+        raise ValueError("'rows' must be a row count or a list of row labels")
+
+    seats_per_row = spec.get('seats_per_row')
+    if not isinstance(seats_per_row, int) or seats_per_row < 1:
+        raise ValueError("'seats_per_row' must be a positive integer")
+
+    def ranges(name):
+        items = spec.get(name) or []
+        if not isinstance(items, list):
+            raise ValueError(f"'{name}' must be a list")
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError(f"'{name}' entries must be objects")
+            for row in _parse_rows(item.get('rows'), rows):
+                for number in _parse_numbers(item.get('numbers'), seats_per_row):
+                    yield row, number
+
+    gaps = set(ranges('gaps'))
+    types = {}
+    for key in ranges('vip'):
+        types[key] = Seat.SeatType.VIP
+    for key in ranges('couple'):
+        types[key] = Seat.SeatType.COUPLE
+
+    plan = {}
+    for row in rows:
+        number = 1
+        while number <= seats_per_row:
+            key = (row, number)
+            if key not in gaps:
+                plan[key] = types.get(key, Seat.SeatType.STANDARD)
+                if plan[key] == Seat.SeatType.COUPLE:
+                    if number + 1 > seats_per_row:
+                        raise ValueError(
+                            f'Couple seat {row}{number} needs seat {number + 1}, '
+                            f'beyond seats_per_row {seats_per_row}')
+                    number += 1
+            number += 1
+    if not plan:
+        raise ValueError('Layout has no seats')
+    return plan
+
+
+def apply_seat_plan(screen, plan):
+    """
+    Đồng bộ ghế của phòng chiếu với plan bằng bulk_create/bulk_update.
+    Ghế không còn trong plan bị xoá, trừ ghế đã có booking thì chỉ tắt is_active.
+    """
+    with transaction.atomic():
+        # Cùng khoá với Seat.save để vị trí ghế mới không trùng với ghế thêm đồng thời
+        list(Screen.objects.select_for_update().filter(id=screen.id).values_list('id'))
+        existing = {
+            (seat.row, seat.number): seat
+            for seat in Seat.objects.filter(screen=screen).select_for_update()
+        }
+
+        changed = []
+        for key, seat in existing.items():
+            if key in plan and (seat.type != plan[key] or not seat.is_active):
+                seat.type = plan[key]
+                seat.is_active = True
+                changed.append(seat)
+        Seat.objects.bulk_update(changed, ['type', 'is_active'])
+
+        removed = [seat.id for key, seat in existing.items() if key not in plan]
+        if removed:
+            booked = set(BookingSeat.objects.filter(seat_id__in=removed)
+                         .values_list('seat_id', flat=True).distinct())
+            Seat.objects.filter(id__in=booked, is_active=True).update(is_active=False)
+            Seat.objects.filter(id__in=[seat_id for seat_id in removed if seat_id not in booked]).delete()
+
+        # Ghế mới nhận vị trí nối tiếp để không làm lệch bitmap các suất chiếu cũ
+        last = Seat.objects.filter(screen=screen).aggregate(Max('position'))['position__max']
+        next_position = 0 if last is None else last + 1
+        created = []
+        for key in sorted(plan):
+            if key not in existing:
+                created.append(Seat(screen=screen, row=key[0], number=key[1],
+                                    type=plan[key], position=next_position))
+                next_position += 1
+        Seat.objects.bulk_create(created)
+
+        # invalidate_layout ghi capacity theo số ghế đang hoạt động
+        screen.capacity = len(plan)
+        invalidate_layout(screen.id)
+
+        # Suất chiếu chưa diễn ra cần tính lại số ghế trống theo sơ đồ mới
+        reconcile_available_seats(Showtime.objects.filter(
+            screen=screen, status=Showtime.ShowStatus.SCHEDULED
+        ).values_list('id', flat=True))
+
+    return {'created': len(created), 'updated': len(changed), 'removed': len(removed)}
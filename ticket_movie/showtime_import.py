@@ -0,0 +1,238 @@
+"""
+Nhập lịch chiếu hàng loạt từ CSV hoặc JSON Lines.
+
+Dữ liệu được đọc theo luồng và xử lý từng khối settings.SHOWTIME_IMPORT_CHUNK_SIZE
+dòng: kiểm tra movie/screen và chồng giờ (IntervalIndex) của cả khối bằng vài
+truy vấn rồi bulk_create các dòng hợp lệ. Dòng lỗi được báo lại theo số dòng,
+không làm hỏng cả lần nhập, và bộ nhớ dùng không phụ thuộc kích thước file.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ticket_movie.catalog_cache import bump_catalog_version
+from ticket_movie.models import Movie, Screen, Showtime
+from ticket_movie.showtime_overlap import IntervalIndex, is_overlap_violation
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def iter_rows(stream, fmt):
+    """Đọc từng dòng của file nhị phân, trả về (số dòng, dict hoặc lỗi đọc)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, f'Invalid JSON: {e}'
+                continue
+            yield line_no, row if isinstance(row, dict) else 'Each line must be a JSON object'
+    else:
+        raise ValueError(f"Unsupported format '{fmt}', use one of: {', '.join(FORMATS)}")
+    text.detach()
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_time(value):
+    try:
+        value = parse_datetime(str(value).strip())
+    except ValueError:
+        value = None
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_row(row):
+    """Chuẩn hoá 1 dòng, trả về (dữ liệu, {trường: lỗi})"""
+    errors = {}
+    data = {}
+    for field in ('movie', 'screen'):
+        data[field] = _parse_id(row.get(field))
+        if data[field] is None:
+            errors[field] = 'A valid integer id is required.'
+    for field in ('start_time', 'end_time'):
+        data[field] = _parse_time(row.get(field))
+        if data[field] is None:
+            errors[field] = 'Invalid date format. Use ISO format: YYYY-MM-DDTHH:MM:SS±HH:MM'
+    try:
+        data['base_price'] = Decimal(str(row.get('base_price')).strip())
+        if not data['base_price'].is_finite() or data['base_price'] < 0:
+            raise InvalidOperation
+    except InvalidOperation:
+        errors['base_price'] = 'A valid non-negative price is required.'
+    data['status'] = row.get('status') or Showtime.ShowStatus.SCHEDULED
+    if data['status'] not in Showtime.ShowStatus.values:
+        errors['status'] = f"'{data['status']}' is not a valid status."
+    if 'start_time' not in errors and 'end_time' not in errors \
+            and data['start_time'] >= data['end_time']:
+        errors['end_time'] = 'End time must be after start time.'
+    return data, errors
+
+
+class ShowtimeImport:
+    """
+    Kết quả của 1 lần nhập. Lỗi chỉ giữ tối đa max_errors dòng đầu; on_error
+    (nếu có) nhận mọi lỗi ngay khi gặp để ghi ra ngoài.
+    """
+
+    def __init__(self, chunk_size=None, dry_run=False, max_errors=None, on_error=None):
+        self.chunk_size = chunk_size or settings.SHOWTIME_IMPORT_CHUNK_SIZE
+        self.dry_run = dry_run
+        self.max_errors = settings.SHOWTIME_IMPORT_MAX_ERRORS if max_errors is None else max_errors
+        self.on_error = on_error
+        self.total = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        # Số ghế của phòng chiếu được nhớ suốt lần nhập, mỗi phòng chỉ đếm 1 lần
+        self.screen_seats = {}
+        # dry_run không ghi DB nên các khối sau không thấy dòng hợp lệ của khối trước
+        # qua IntervalIndex.load: giữ lại (screen, start, end, khoá) để nạp thêm
+        self.accepted = []
+
+    def error(self, line, errors):
+        self.failed += 1
+        item = {'line': line, 'errors': errors}
+        if len(self.errors) < self.max_errors:
+            self.errors.append(item)
+        if self.on_error:
+            self.on_error(item)
+
+    def run(self, stream, fmt):
+        rows = iter_rows(stream, fmt)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.total += len(chunk)
+            self.import_chunk(chunk)
+        if self.created:
+            bump_catalog_version()
+        return self
+
+    def import_chunk(self, chunk):
+        parsed = []
+        for line, row in chunk:
+            if isinstance(row, str):
+                self.error(line, {'non_field_errors': row})
+                continue
+            data, errors = parse_row(row)
+            if errors:
+                self.error(line, errors)
+            else:
+                parsed.append((line, data))
+
+        movie_ids = set(Movie.objects.filter(
+            id__in={data['movie'] for _, data in parsed}).values_list('id', flat=True))
+        screen_ids = {data['screen'] for _, data in parsed} - self.screen_seats.keys()
+        if screen_ids:
+            self.screen_seats.update(
+                Screen.objects.filter(id__in=screen_ids).values_list('id').annotate(
+                    seats=Count('seat', filter=Q(seat__is_active=True))))
+
+        # Suất chiếu đã có trong khoảng thời gian của khối, dùng để bắt chồng giờ
+        # với dữ liệu cũ lẫn giữa các dòng trong file
+        scheduled = [data for _, data in parsed if data['status'] != Showtime.ShowStatus.CANCELLED]
+        overlaps = None
+        if scheduled:
+            screens = {data['screen'] for data in scheduled}
+            start = min(data['start_time'] for data in scheduled)
+            end = max(data['end_time'] for data in scheduled)
+            overlaps = IntervalIndex.load(screens, start, end)
+            for screen_id, start_time, end_time, key in self.accepted:
+                if (screen_id in screens and start_time < end + overlaps.buffer
+                        and end_time > start - overlaps.buffer):
+                    overlaps.add(screen_id, start_time, end_time, key)
+
+        valid = []
+        for line, data in parsed:
+            errors = {}
+            if data['movie'] not in movie_ids:
+                errors['movie'] = f"Movie {data['movie']} does not exist."
+            if data['screen'] not in self.screen_seats:
+                errors['screen'] = f"Screen {data['screen']} does not exist."
+            elif data['status'] != Showtime.ShowStatus.CANCELLED:
+                conflict = overlaps.check_and_add(
+                    data['screen'], data['start_time'], data['end_time'], f'line {line}')
+                if conflict is not None:
+                    errors['start_time'] = f'Showtime overlaps {conflict} on this screen.'
+            if errors:
+                self.error(line, errors)
+            else:
+                valid.append((line, self.build(data)))
+
+        if self.dry_run:
+            self.created += len(valid)
+            self.accepted.extend(
+                (showtime.screen_id, showtime.start_time, showtime.end_time, f'line {line}')
+                for line, showtime in valid if showtime.status != Showtime.ShowStatus.CANCELLED)
+            return
+        if not valid:
+            return
+        try:
+            with transaction.atomic():
+                Showtime.objects.bulk_create([showtime for _, showtime in valid])
+            self.created += len(valid)
+        except IntegrityError:
+            # Một dòng vi phạm ràng buộc: chèn lại từng dòng để biết dòng nào lỗi
+            for line, showtime in valid:
+                showtime.pk = None
+                try:
+                    with transaction.atomic():
+                        showtime.save(force_insert=True)
+                    self.created += 1
+                except IntegrityError as e:
+                    message = ('Showtime overlaps another showtime on this screen.'
+                               if is_overlap_violation(e) else str(e).strip())
+                    self.error(line, {'non_field_errors': message})
+
+    def build(self, data):
+        return Showtime(
+            movie_id=data['movie'], screen_id=data['screen'],
+            start_time=data['start_time'], end_time=data['end_time'],
+            base_price=data['base_price'], status=data['status'],
+            available_seats=self.screen_seats[data['screen']])
+
+    def report(self):
+        return {
+            'total': self.total,
+            'created': self.created,
+            'failed': self.failed,
+            'dry_run': self.dry_run,
+            'errors': self.errors,
+        }
+
+
+def import_showtimes(stream, fmt, **options):
+    return ShowtimeImport(**options).run(stream, fmt)
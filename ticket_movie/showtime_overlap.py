@@ -0,0 +1,90 @@
+"""
+Phát hiện suất chiếu chồng giờ trên cùng phòng chiếu.
+
+Hai suất chiếu chưa huỷ xung đột khi khoảng [start_time, end_time + buffer) của
+chúng giao nhau, với buffer là thời gian dọn phòng (settings.SHOWTIME_CLEANING_BUFFER).
+Ràng buộc exclusion exclude_overlapping_showtimes trong PostgreSQL là lớp bảo vệ
+cuối cùng cho trường hợp chồng giờ thực sự khi nhiều người ghi cùng lúc.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+
+from ticket_movie.models import Showtime
+
+CONSTRAINT_NAME = 'exclude_overlapping_showtimes'
+
+
+def cleaning_buffer():
+    return settings.SHOWTIME_CLEANING_BUFFER
+
+
+def is_overlap_violation(error):
+    """IntegrityError có phải do ràng buộc exclusion chồng giờ không"""
+    return CONSTRAINT_NAME in str(error)
+
+
+def overlapping_showtimes(screen_id, start, end, exclude_id=None, buffer=None):
+    buffer = cleaning_buffer() if buffer is None else buffer
+    queryset = Showtime.objects.filter(
+        screen_id=screen_id, start_time__lt=end + buffer, end_time__gt=start - buffer,
+    ).exclude(status=Showtime.ShowStatus.CANCELLED)
+    if exclude_id is not None:
+        queryset = queryset.exclude(id=exclude_id)
+    return queryset.order_by('start_time')
+
+
+def find_overlap(screen_id, start, end, exclude_id=None, buffer=None):
+    """Suất chiếu đầu tiên xung đột với khoảng [start, end) của phòng chiếu, hoặc None"""
+    return overlapping_showtimes(screen_id, start, end, exclude_id, buffer).first()
+
+
+class IntervalIndex:
+    """
+    Các khoảng [start, end + buffer) không giao nhau của từng phòng chiếu, sắp
+    theo start. Vì không giao nhau nên end cũng tăng dần: khoảng mới chỉ có thể
+    xung đột với khoảng đứng ngay trước vị trí chèn và khoảng ngay sau nó.
+    """
+
+    def __init__(self, buffer=None):
+        self.buffer = cleaning_buffer() if buffer is None else buffer
+        self.screens = defaultdict(list)
+
+    def find(self, screen_id, start, end):
+        """Khoá của khoảng đã có xung đột với [start, end), hoặc None"""
+        intervals = self.screens.get(screen_id)
+        if not intervals:
+            return None
+        end += self.buffer
+        i = bisect_left(intervals, (end,))
+        # intervals[i - 1] là khoảng cuối cùng bắt đầu trước end, cũng là khoảng kết thúc muộn nhất
+        if i and intervals[i - 1][1] > start:
+            return intervals[i - 1][2]
+        return None
+
+    def add(self, screen_id, start, end, key):
+        insort(self.screens[screen_id], (start, end + self.buffer, key))
+
+    def check_and_add(self, screen_id, start, end, key):
+        """Thêm khoảng nếu không xung đột; trả về khoá của khoảng xung đột nếu có"""
+        conflict = self.find(screen_id, start, end)
+        if conflict is None:
+            self.add(screen_id, start, end, key)
+        return conflict
+
+    @classmethod
+    def load(cls, screen_ids, start, end, buffer=None):
+        """Dựng chỉ mục từ các suất chiếu chưa huỷ của các phòng chiếu trong khoảng thời gian"""
+        index = cls(buffer)
+        showtimes = Showtime.objects.filter(
+            screen_id__in=screen_ids,
+            start_time__lt=end + index.buffer, end_time__gt=start - index.buffer,
+        ).exclude(status=Showtime.ShowStatus.CANCELLED).values_list(
+            'id', 'screen_id', 'start_time', 'end_time')
+        for showtime_id, screen_id, start_time, end_time in showtimes:
+            index.screens[screen_id].append(
+                (start_time, end_time + index.buffer, f'showtime {showtime_id}'))
+        for intervals in index.screens.values():
+            intervals.sort()
+        return index
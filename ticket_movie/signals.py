@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ticket_movie.authentication import invalidate_cached_user
+from ticket_movie.catalog_cache import bump_catalog_version
+from ticket_movie.models import Cinema, City, Movie, Promotion, Screen, Seat, Showtime, User
+from ticket_movie.promotion_index import invalidate_promotion_index
+from ticket_movie.seat_layout import invalidate_layout
+
+
+@receiver([post_save, post_delete], sender=Seat)
+def seat_changed(sender, instance, **kwargs):
+    invalidate_layout(instance.screen_id)
+
+
+@receiver([post_save, post_delete], sender=Screen)
+def screen_changed(sender, instance, **kwargs):
+    invalidate_layout(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Movie)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Cinema)
+@receiver([post_save, post_delete], sender=Screen)
+@receiver([post_save, post_delete], sender=Showtime)
+def catalog_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Promotion)
+def promotion_changed(sender, instance, **kwargs):
+    invalidate_promotion_index()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Xoá cả sau commit để request khác không kịp cache lại dữ liệu cũ trong lúc transaction chưa xong
+    invalidate_cached_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
@@ -0,0 +1,127 @@
+"""
+Gọi API của Google/Facebook để đổi access token lấy thông tin user.
+
+Mỗi luồng giữ 1 requests.Session có pool kết nối keep-alive nên không phải bắt
+tay TLS lại ở mỗi lần đăng nhập; mọi request có timeout kết nối/đọc riêng
+(settings.SOCIAL_AUTH_TIMEOUT). Profile của token hợp lệ được cache ngắn hạn
+(settings.SOCIAL_PROFILE_CACHE_TIMEOUT) theo sha256 của token. Địa chỉ API lấy
+từ settings.SOCIAL_AUTH_PROVIDERS nên có thể trỏ sang 1 server giả lập khi test.
+"""
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+class SocialAuthError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+_local = threading.local()
+
+
+def get_session():
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(settings.SOCIAL_AUTH_PROVIDERS),
+                              pool_maxsize=settings.SOCIAL_AUTH_POOL_SIZE, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
+
+
+class ProviderClient(ABC):
+    name = None
+    label = None
+
+    @property
+    def config(self):
+        return settings.SOCIAL_AUTH_PROVIDERS[self.name]
+
+    @abstractmethod
+    def request(self, access_token):
+        """Gọi API của provider, trả về requests.Response"""
+
+    @abstractmethod
+    def parse(self, data):
+        """Chuyển dữ liệu provider trả về thành dict social_id, email, full_name, avatar"""
+
+    def fetch_profile(self, access_token):
+        key = f'social:{self.name}:{hashlib.sha256(access_token.encode()).hexdigest()}'
+        profile = cache.get(key)
+        if profile is not None:
+            return profile
+
+        try:
+            resp = self.request(access_token)
+        except requests.Timeout:
+            raise SocialAuthError(f'{self.label} did not respond in time', status=504)
+        except requests.RequestException:
+            raise SocialAuthError(f'Cannot connect to {self.label}', status=502)
+        if resp.status_code != 200:
+            raise SocialAuthError(f'Invalid {self.label} token')
+        try:
+            profile = self.parse(resp.json())
+        except ValueError:
+            raise SocialAuthError(f'Invalid {self.label} response', status=502)
+        if not profile.get('social_id'):
+            raise SocialAuthError(f'Invalid {self.label} token')
+
+        cache.set(key, profile, settings.SOCIAL_PROFILE_CACHE_TIMEOUT)
+        return profile
+
+
+class GoogleClient(ProviderClient):
+    name = 'google'
+    label = 'Google'
+
+    def request(self, access_token):
+        return get_session().get(
+            self.config['userinfo_url'],
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=settings.SOCIAL_AUTH_TIMEOUT)
+
+    def parse(self, data):
+        return {
+            'social_id': data.get('sub'),
+            'email': data.get('email'),
+            'full_name': data.get('name'),
+            'avatar': data.get('picture'),
+        }
+
+
+class FacebookClient(ProviderClient):
+    name = 'facebook'
+    label = 'Facebook'
+
+    def request(self, access_token):
+        return get_session().get(
+            self.config['userinfo_url'],
+            params={'fields': 'id,name,email,picture', 'access_token': access_token},
+            timeout=settings.SOCIAL_AUTH_TIMEOUT)
+
+    def parse(self, data):
+        return {
+            'social_id': data.get('id'),
+            'email': data.get('email'),
+            'full_name': data.get('name'),
+            'avatar': data.get('picture', {}).get('data', {}).get('url'),
+        }
+
+
+CLIENTS = {client.name: client() for client in (GoogleClient, FacebookClient)}
+
+
+def get_provider_client(provider):
+    client = CLIENTS.get(provider)
+    if client is None:
+        raise SocialAuthError('Provider not supported')
+    return client
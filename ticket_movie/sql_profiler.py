@@ -0,0 +1,171 @@
+"""
+Đo truy vấn SQL của từng request: số truy vấn, tổng thời gian DB và các câu SQL
+cùng dạng (chỉ khác tham số) chạy lặp nhiều lần trong 1 request, dấu hiệu N+1.
+
+Bật bằng settings.SQL_PROFILING. Kết quả trả về qua header X-DB-Query-Count,
+X-DB-Time-Ms, X-DB-Repeated-Queries, Server-Timing và log của logger
+ticket_movie.sql_profiler (INFO, WARNING khi có truy vấn lặp) kèm
+extra={'sql_profile': {...}}, ProfileFormatter ghi mỗi request thành 1 dòng JSON
+(xem LOGGING trong backend/settings.py). Khi tắt, middleware tự gỡ khỏi chuỗi middleware
+và không gắn gì vào kết nối DB nên không tốn chi phí.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_profile = ContextVar('sql_profile', default=None)
+
+# Danh sách tham số có độ dài thay đổi: IN (%s), IN (%s, %s, ...), VALUES (%s, %s), (%s, %s)...
+_REPEATED_GROUP = re.compile(r'(\([^()]*\))(?:, \1)+')
+_REPEATED_PARAM = re.compile(r'\(%s(?:, %s)*\)')
+
+# Cache dạng SQL theo digest của câu SQL: không giữ lại câu SQL gốc (có thể rất dài
+# với IN (...) lớn), chỉ giữ dạng đã gộp danh sách tham số
+SHAPE_CACHE_SIZE = 1024
+_shapes = OrderedDict()
+_shapes_lock = threading.Lock()
+
+
+def sql_shape(sql):
+    """Dạng của câu SQL: gộp các danh sách tham số để IN (%s) và IN (%s, %s) là 1 dạng"""
+    key = hashlib.blake2b(sql.encode(), digest_size=16).digest()
+    with _shapes_lock:
+        shape = _shapes.get(key)
+        if shape is not None:
+            _shapes.move_to_end(key)
+            return shape
+    shape = _REPEATED_GROUP.sub(r'\1, ...', _REPEATED_PARAM.sub('(%s, ...)', sql))
+    with _shapes_lock:
+        _shapes[key] = shape
+        if len(_shapes) > SHAPE_CACHE_SIZE:
+            _shapes.popitem(last=False)
+    return shape
+
+
+class ProfileFormatter(logging.Formatter):
+    """Mỗi bản ghi thành 1 dòng JSON: thời điểm, level, message và dữ liệu sql_profile"""
+
+    def format(self, record):
+        return json.dumps({
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            **getattr(record, 'sql_profile', {}),
+        }, default=str)
+
+
+class QueryProfile:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = defaultdict(lambda: [0, 0.0])
+
+    def add(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        shape = self.shapes[sql_shape(sql)]
+        shape[0] += 1
+        shape[1] += duration
+
+    def repeated(self, threshold):
+        """Các dạng SQL chạy từ threshold lần trở lên, lặp nhiều nhất trước"""
+        return sorted(
+            ({'sql': sql, 'count': count, 'time_ms': round(duration * 1000, 2)}
+             for sql, (count, duration) in self.shapes.items() if count >= threshold),
+            key=lambda item: -item['count'])
+
+
+def profile_execute(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add(sql, time.perf_counter() - started)
+
+
+def install(connection, **kwargs):
+    if profile_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_execute)
+
+
+class SQLProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Kết nối mở sau này (ở mọi luồng) được gắn qua signal
+        connection_created.connect(install, dispatch_uid='sql_profiler')
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Kết nối của luồng này có thể đã mở trước khi middleware được tạo
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        profile = QueryProfile()
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.report(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = QueryProfile()
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.report(request, response, profile)
+
+    def report(self, request, response, profile):
+        repeated = profile.repeated(settings.SQL_PROFILING_REPEAT_THRESHOLD)
+        time_ms = round(profile.duration * 1000, 2)
+
+        response['X-DB-Query-Count'] = str(profile.count)
+        response['X-DB-Time-Ms'] = f'{time_ms:.2f}'
+        response['X-DB-Repeated-Queries'] = str(len(repeated))
+        server_timing = f'db;dur={time_ms:.2f};desc="{profile.count} queries"'
+        if response.has_header('Server-Timing'):
+            server_timing = f"{response['Server-Timing']}, {server_timing}"
+        response['Server-Timing'] = server_timing
+
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'query_count': profile.count,
+            'db_time_ms': time_ms,
+            'repeated': repeated,
+        }
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            '%s %s: %d queries, %.2f ms DB, %d repeated SQL shape(s)',
+            request.method, request.path, profile.count, time_ms, len(repeated),
+            extra={'sql_profile': data})
+        return response
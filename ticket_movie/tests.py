@@ -1,3 +1,1172 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ticket_movie import catalog_cache, live, promotion_index, social, token_blacklist
+from ticket_movie.authentication import STAMP_KEY, CachedJWTAuthentication, clear_user_cache
+from ticket_movie.db_router import (
+    PIN_KEY, ReplicaRouter, RequestState, _request_state, pin_to_primary, read_from_replica
+)
+from ticket_movie.app.serializers import ScreenSerializer
+from ticket_movie.booking import (
+    BookingError, SeatConflictError, SoldOutError, cancel_booking, create_booking, expire_holds,
+    reconcile_available_seats
+)
+from ticket_movie.i18n import get_catalog
+from ticket_movie.models import (
+    AppliedPromotion, Booking, BookingSeat, Cinema, City, Movie, Promotion, Screen, Seat, Showtime,
+    User
+)
+from ticket_movie.occupancy import build_bitmap, rebuild_bitmaps
+from ticket_movie.promotions import (
+    PromotionError, active_promotions, compute_discount, redeem_promotion
+)
+from ticket_movie.seat_layout import apply_seat_plan, build_seat_plan, get_layout, render_seat_map
+from ticket_movie.showtime_import import import_showtimes
+from ticket_movie.sql_profiler import SQLProfilerMiddleware, sql_shape
+from ticket_movie.showtime_overlap import IntervalIndex
+from ticket_movie.token_blacklist import BlacklistFilter, BloomFilter, RefreshToken
+
+
+def create_showtime(seat_count=4, base_price=Decimal('90000'), start_in=timedelta(days=1)):
+    """1 suất chiếu mới trên 1 phòng chiếu có seat_count ghế thường ở hàng A"""
+    city = City.objects.create(name='Ha Noi')
+    cinema = Cinema.objects.create(city=city, name='Cinema', address='1 Street')
+    movie = Movie.objects.create(title='Movie', duration=120, release_date=timezone.now().date())
+    screen = Screen.objects.create(cinema=cinema, name='Screen 1', capacity=seat_count)
+    seats = Seat.objects.bulk_create([
+        Seat(screen=screen, row='A', number=number, position=number - 1)
+        for number in range(1, seat_count + 1)
+    ])
+    start_time = timezone.now() + start_in
+    showtime = Showtime.objects.create(
+        movie=movie, screen=screen, base_price=base_price, available_seats=seat_count,
+        start_time=start_time, end_time=start_time + timedelta(hours=2))
+    return showtime, seats
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are PostgreSQL specific')
+class HotQueryIndexTests(TestCase):
+    """
+    Các truy vấn nóng phải đi qua đúng index được tạo cho chúng (kể cả Bitmap
+    Index Scan). Tắt enable_seqscan để planner không chọn Seq Scan vì dữ liệu
+    mẫu ít, nên kết quả không phụ thuộc vào lượng dữ liệu mẫu.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.user = User.objects.create_user(
+            email='explain@example.com', password='Explain-Plan-2025', full_name='Explain')
+        city = City.objects.create(name='Ho Chi Minh')
+        cinema = Cinema.objects.create(city=city, name='Cinema', address='1 Street')
+        movie = Movie.objects.create(title='Movie', duration=120, release_date=now.date())
+        cls.screen = Screen.objects.create(cinema=cinema, name='Screen 1', capacity=50)
+        seats = Seat.objects.bulk_create([
+            Seat(screen=cls.screen, row=row, number=number, position=index)
+            for index, (row, number) in enumerate(
+                (row, number) for row in 'ABCDE' for number in range(1, 11))
+        ])
+        showtimes = Showtime.objects.bulk_create([
+            Showtime(movie=movie, screen=cls.screen, base_price=Decimal('90000'),
+                     available_seats=50,
+                     start_time=now + timedelta(hours=3 * i),
+                     end_time=now + timedelta(hours=3 * i + 2))
+            for i in range(200)
+        ])
+        cls.showtime = showtimes[0]
+        bookings = Booking.objects.bulk_create([
+            Booking(user=cls.user, showtime=showtimes[i % 200], booking_code=f'EXPLAIN{i:05d}',
+                    total_amount=Decimal('90000'), expires_at=now + timedelta(minutes=i))
+            for i in range(1000)
+        ])
+        cls.booking = bookings[0]
+        BookingSeat.objects.bulk_create([
+            BookingSeat(booking=booking, showtime_id=booking.showtime_id,
+                        seat=seats[i // 200], price=Decimal('90000'))
+            for i, booking in enumerate(bookings)
+        ])
+        Promotion.objects.bulk_create([
+            Promotion(code=f'PROMO{i:04d}', name=f'Promo {i}', discount_type='fixed',
+                      discount_value=Decimal('10000'), start_date=now - timedelta(days=1),
+                      end_date=now + timedelta(days=i), is_active=i % 2 == 0)
+            for i in range(500)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertRegex(
+            plan, rf'(Index (Only )?Scan (Backward )?using|Bitmap Index Scan on) {index_name}\b', plan)
+
+    def test_showtimes_by_screen_status_start_time(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Showtime.objects.filter(
+                screen_id=self.screen.id, status=Showtime.ShowStatus.SCHEDULED,
+                start_time__gte=now, start_time__lt=now + timedelta(days=1)),
+            'idx_showtime_screen_status')
+
+    def test_bookings_by_showtime_status(self):
+        self.assertUsesIndex(
+            Booking.objects.filter(
+                showtime_id=self.showtime.id, status=Booking.BookingStatus.PENDING),
+            'idx_booking_showtime_status')
+
+    def test_pending_bookings_by_expiry(self):
+        self.assertUsesIndex(
+            Booking.objects.filter(
+                status=Booking.BookingStatus.PENDING, expires_at__lte=timezone.now()
+            ).order_by('expires_at')[:500],
+            'idx_booking_pending_expiry')
+
+    def test_booking_seats_by_booking(self):
+        self.assertUsesIndex(
+            BookingSeat.objects.filter(booking_id=self.booking.id, is_active=True),
+            'idx_bookingseat_active_booking')
+
+    def test_booking_seats_by_showtime_and_seat(self):
+        self.assertUsesIndex(
+            BookingSeat.objects.filter(
+                showtime_id=self.showtime.id, seat_id__in=[1, 2, 3], is_active=True),
+            'unique_active_showtime_seat')
+
+    def test_promotion_by_code(self):
+        # Unique index của cột code (tạo cùng bảng ở 0001)
+        now = timezone.now()
+        self.assertUsesIndex(
+            Promotion.objects.filter(
+                code='PROMO0002', is_active=True, start_date__lte=now, end_date__gte=now),
+            'promotions_code_key')
+
+    def test_active_promotions_in_window(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Promotion.objects.filter(is_active=True, start_date__lte=now, end_date__gte=now),
+            'idx_promotion_active_window')
+
+
+@override_settings(SEAT_EVENTS_BROKER='ticket_movie.live.LocalBroker')
+class SeatEventStreamTests(TestCase):
+    """Đặt vé, huỷ và hết hạn giữ ghế đều đẩy delta tới luồng SSE của suất chiếu"""
+
+    def setUp(self):
+        live._broker = None
+        self.addCleanup(setattr, live, '_broker', None)
+        self.user = User.objects.create_user(
+            email='events@example.com', password='Seat-Events-2025', full_name='Events')
+        self.showtime, self.seats = create_showtime()
+
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.stream = seat_stream = live.seat_event_stream(self.showtime.id, heartbeat=60)
+        self.addCleanup(lambda: self.loop.run_until_complete(seat_stream.aclose()))
+        # Dòng đầu tiên (retry) đăng ký subscription với broker
+        self.assertTrue(self.next_chunk().startswith('retry:'))
+
+    def next_chunk(self):
+        return self.loop.run_until_complete(asyncio.wait_for(self.stream.__anext__(), 1))
+
+    def next_seats_event(self):
+        event, data = self.next_chunk().strip().split('\n')
+        self.assertEqual(event, 'event: seats')
+        return json.loads(data.removeprefix('data: '))
+
+    def test_book_cancel_and_expire_events(self):
+        first, second = self.seats[0].id, self.seats[1].id
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = create_booking(self.user, self.showtime.id, [first])
+        self.assertEqual(self.next_seats_event(),
+                         {'type': 'seats', 'showtime_id': self.showtime.id,
+                          'booked': [first], 'released': []})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_booking(booking.id, user=self.user)
+        self.assertEqual(self.next_seats_event()['released'], [first])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_booking(self.user, self.showtime.id, [second])
+        self.assertEqual(self.next_seats_event()['booked'], [second])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_holds(now=timezone.now() + settings.BOOKING_HOLD_TTL + timedelta(minutes=1))
+        self.assertEqual(self.next_seats_event()['released'], [second])
+
+    def test_stream_ends_after_max_lifetime(self):
+        stream = live.seat_event_stream(self.showtime.id, heartbeat=60, max_lifetime=0.05)
+        self.assertTrue(self.loop.run_until_complete(stream.__anext__()).startswith('retry:'))
+        with self.assertRaises(StopAsyncIteration):
+            self.loop.run_until_complete(asyncio.wait_for(stream.__anext__(), 1))
+
+    def test_wsgi_request_is_refused(self):
+        response = self.client.get(f'/app/api/main/screen/seat/events/{self.showtime.id}/')
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(SEAT_EVENTS_MAX_STREAM_SECONDS=0.05)
+    def test_asgi_request_streams_events(self):
+        async def read():
+            response = await AsyncClient().get(
+                f'/app/api/main/screen/seat/events/{self.showtime.id}/')
+            return response, [chunk.decode() async for chunk in response.streaming_content]
+
+        response, chunks = self.loop.run_until_complete(asyncio.wait_for(read(), 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(chunks, ['retry: 3000\n\n'])
+
+    def test_expire_bookings_refuses_in_process_broker(self):
+        with self.assertRaises(CommandError):
+            call_command('expire_bookings', once=True)
+
+
+class SeatBookingTests(TestCase):
+    """Mỗi ghế của 1 suất chiếu chỉ được giữ bởi 1 booking, người đến sau nhận 409"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='booking@example.com', password='Seat-Booking-2025', full_name='Booking')
+        self.showtime, self.seats = create_showtime()
+
+    def book(self, seat_ids):
+        return self.client.post('/app/api/main/screen/seat/booking/', {
+            'user_id': self.user.id, 'showtime_id': self.showtime.id, 'seats_id': seat_ids,
+        }, content_type='application/json')
+
+    def test_taken_seats_return_conflict(self):
+        first, second, third = (seat.id for seat in self.seats[:3])
+        self.assertEqual(self.book([first, second]).status_code, 200)
+
+        response = self.book([second, third])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflict_seats'], [second])
+        # Cả giỏ bị từ chối: ghế còn trống trong giỏ cũng không bị giữ
+        self.assertFalse(BookingSeat.objects.filter(seat_id=third).exists())
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_unique_constraint_catches_seat_missing_from_bitmap(self):
+        # Ghế đã được giữ nhưng bitmap chưa cập nhật: ràng buộc unique ở DB vẫn chặn
+        other = Booking.objects.create(
+            user=self.user, showtime=self.showtime, booking_code='RACE000001',
+            total_amount=Decimal('90000'))
+        BookingSeat.objects.create(booking=other, showtime=self.showtime, seat=self.seats[0],
+                                   price=Decimal('90000'))
+        with self.assertRaises(SeatConflictError) as raised:
+            create_booking(self.user, self.showtime.id, [self.seats[0].id, self.seats[1].id])
+        self.assertEqual(raised.exception.seat_ids, [self.seats[0].id])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_client_total_must_match_seat_prices(self):
+        response = self.client.post('/app/api/main/screen/seat/booking/', {
+            'user_id': self.user.id, 'showtime_id': self.showtime.id,
+            'seats_id': [self.seats[0].id], 'total_amount': '1000',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+        with self.assertRaises(BookingError):
+            create_booking(self.user, self.showtime.id, [self.seats[0].id], total_amount='abc')
+
+        booking = create_booking(self.user, self.showtime.id, [self.seats[0].id],
+                                 total_amount='90000.00')
+        self.assertEqual(booking.total_amount, Decimal('90000'))
+
+    def test_released_seat_can_be_booked_again(self):
+        booking = create_booking(self.user, self.showtime.id, [self.seats[0].id])
+        cancel_booking(booking.id, user=self.user)
+        self.assertEqual(self.book([self.seats[0].id]).status_code, 200)
+        self.assertEqual(
+            BookingSeat.objects.filter(seat=self.seats[0], is_active=True).count(), 1)
+
+
+class AvailableSeatsTests(TestCase):
+    """available_seats chỉ thay đổi bằng UPDATE có điều kiện và không bao giờ âm"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='seats@example.com', password='Available-Seats-2025', full_name='Seats')
+        self.showtime, self.seats = create_showtime()
+
+    def available_seats(self):
+        self.showtime.refresh_from_db(fields=['available_seats'])
+        return self.showtime.available_seats
+
+    def test_booking_and_cancel_adjust_available_seats(self):
+        booking = create_booking(self.user, self.showtime.id, [seat.id for seat in self.seats[:3]])
+        self.assertEqual(self.available_seats(), 1)
+        cancel_booking(booking.id, user=self.user)
+        self.assertEqual(self.available_seats(), 4)
+
+    def test_decrement_below_zero_is_rejected(self):
+        Showtime.objects.filter(id=self.showtime.id).update(available_seats=1)
+        with self.assertRaises(SoldOutError):
+            create_booking(self.user, self.showtime.id, [self.seats[0].id, self.seats[1].id])
+        # Booking và ghế đã insert bị rollback cùng lần trừ thất bại
+        self.assertEqual(self.available_seats(), 1)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(BookingSeat.objects.exists())
+
+    def test_sold_out_response(self):
+        Showtime.objects.filter(id=self.showtime.id).update(available_seats=0)
+        response = self.client.post('/app/api/main/screen/seat/booking/', {
+            'user_id': self.user.id, 'showtime_id': self.showtime.id,
+            'seats_id': [self.seats[0].id],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn('conflict_seats', response.json())
+
+    def test_reconcile_fixes_drift(self):
+        create_booking(self.user, self.showtime.id, [self.seats[0].id])
+        Showtime.objects.filter(id=self.showtime.id).update(available_seats=0)
+        self.assertEqual(reconcile_available_seats([self.showtime.id]),
+                         [(self.showtime.id, 0, 3)])
+        self.assertEqual(self.available_seats(), 3)
+        self.assertEqual(reconcile_available_seats([self.showtime.id]), [])
+
+
+class SeatBitmapRebuildTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='bitmap@example.com', password='Seat-Bitmap-2025', full_name='Bitmap')
+        self.showtime, self.seats = create_showtime(seat_count=12)
+        self.other, _ = create_showtime()
+
+    def stored_bitmap(self, showtime):
+        showtime.refresh_from_db(fields=['seat_bitmap'])
+        return bytes(showtime.seat_bitmap)
+
+    def expected_bitmap(self, showtime):
+        return build_bitmap(BookingSeat.objects.filter(
+            showtime=showtime, is_active=True).values_list('seat__position', flat=True))
+
+    def test_rebuild_matches_active_booking_seats(self):
+        create_booking(self.user, self.showtime.id, [seat.id for seat in self.seats[:2]])
+        booking = create_booking(self.user, self.showtime.id, [self.seats[9].id])
+        cancel_booking(booking.id, user=self.user)
+        create_booking(self.user, self.showtime.id, [self.seats[10].id])
+        self.assertEqual(rebuild_bitmaps([self.showtime.id, self.other.id]), [])
+        self.assertEqual(self.stored_bitmap(self.showtime), self.expected_bitmap(self.showtime))
+
+        # Bitmap lệch: thiếu ghế đã đặt, thừa ghế đã huỷ
+        Showtime.objects.filter(id=self.showtime.id).update(seat_bitmap=build_bitmap([0, 9]))
+        Showtime.objects.filter(id=self.other.id).update(seat_bitmap=build_bitmap([3]))
+        ids = [self.showtime.id, self.other.id]
+        self.assertEqual(sorted(rebuild_bitmaps(ids, apply=False)), sorted(ids))
+        self.assertEqual(self.stored_bitmap(self.showtime), build_bitmap([0, 9]))
+
+        self.assertEqual(sorted(rebuild_bitmaps(ids)), sorted(ids))
+        self.assertEqual(self.stored_bitmap(self.showtime), build_bitmap([0, 1, 10]))
+        self.assertEqual(self.stored_bitmap(self.showtime), self.expected_bitmap(self.showtime))
+        self.assertEqual(self.stored_bitmap(self.other), b'')
+        self.assertEqual(rebuild_bitmaps(ids), [])
+
+
+class PromotionRedemptionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='promo@example.com', password='Promotion-Limit-2025', full_name='Promo')
+        self.showtime, self.seats = create_showtime()
+        now = timezone.now()
+        self.promotion = Promotion.objects.create(
+            code='ONCE', name='Once', discount_type=Promotion.DiscountType.PERCENTAGE,
+            discount_value=Decimal('10'), min_order_value=Decimal('150000'), max_uses=1,
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+
+    def uses(self):
+        self.promotion.refresh_from_db(fields=['current_uses'])
+        return self.promotion.current_uses
+
+    def test_usage_limit(self):
+        booking = create_booking(self.user, self.showtime.id, [self.seats[0].id, self.seats[1].id],
+                                 promotion_code='ONCE')
+        self.assertEqual(booking.total_amount, Decimal('162000'))
+        self.assertEqual(self.uses(), 1)
+
+        with self.assertRaises(PromotionError):
+            create_booking(self.user, self.showtime.id, [self.seats[2].id, self.seats[3].id],
+                           promotion_code='ONCE')
+        # Mã lỗi thì cả booking rollback, ghế vẫn trống
+        self.assertEqual(self.uses(), 1)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertFalse(BookingSeat.objects.filter(seat=self.seats[2]).exists())
+
+    def test_cancel_returns_usage(self):
+        booking = create_booking(self.user, self.showtime.id, [self.seats[0].id, self.seats[1].id],
+                                 promotion_code='ONCE')
+        cancel_booking(booking.id, user=self.user)
+        self.assertEqual(self.uses(), 0)
+        create_booking(self.user, self.showtime.id, [self.seats[2].id, self.seats[3].id],
+                       promotion_code='ONCE')
+        self.assertEqual(self.uses(), 1)
+
+    def test_minimum_uses_server_seat_prices(self):
+        # total_amount đã lưu (vd. booking cũ) không mở khoá được mã khi giá ghế dưới mức tối thiểu
+        booking = create_booking(self.user, self.showtime.id, [self.seats[0].id])
+        booking.total_amount = Decimal('1000000')
+        with self.assertRaises(PromotionError):
+            redeem_promotion(booking, 'ONCE')
+        self.assertEqual(self.uses(), 0)
+        self.assertFalse(AppliedPromotion.objects.exists())
+
+    def test_discount_uses_server_seat_prices(self):
+        booking = create_booking(self.user, self.showtime.id, [self.seats[0].id, self.seats[1].id])
+        booking.total_amount = Decimal('1')
+        redeem_promotion(booking, 'ONCE')
+        booking.refresh_from_db()
+        self.assertEqual(booking.total_amount, Decimal('162000'))
+        self.assertEqual(AppliedPromotion.objects.get(booking=booking).discount_amount,
+                         Decimal('18000'))
+
+
+class IntervalIndexTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.index = IntervalIndex(buffer=timedelta(minutes=15))
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def test_overlap_and_cleaning_buffer(self):
+        self.assertIsNone(self.index.check_and_add(1, self.at(0), self.at(2), 'first'))
+        self.assertIsNone(self.index.check_and_add(1, self.at(4), self.at(6), 'second'))
+        # Chồng giờ với suất trước hoặc suất sau vị trí chèn
+        self.assertEqual(self.index.find(1, self.at(1), self.at(3)), 'first')
+        self.assertEqual(self.index.find(1, self.at(3), self.at(5)), 'second')
+        self.assertEqual(self.index.find(1, self.at(-1), self.at(7)), 'second')
+        # Bắt đầu ngay khi suất trước kết thúc: còn thiếu thời gian dọn phòng
+        self.assertEqual(self.index.find(1, self.at(2), self.at(3)), 'first')
+        self.assertIsNone(self.index.find(1, self.at(2.25), self.at(3.75)))
+        self.assertEqual(self.index.find(1, self.at(2.25), self.at(4)), 'second')
+        # Phòng chiếu khác không bị ảnh hưởng
+        self.assertIsNone(self.index.find(2, self.at(1), self.at(3)))
+
+    def test_conflicting_interval_is_not_added(self):
+        self.index.check_and_add(1, self.at(0), self.at(2), 'first')
+        self.assertEqual(self.index.check_and_add(1, self.at(1), self.at(3), 'rejected'), 'first')
+        self.assertIsNone(self.index.check_and_add(1, self.at(2.5), self.at(3), 'after'))
+
+    def test_load_skips_cancelled_showtimes(self):
+        showtime, _ = create_showtime(start_in=timedelta(days=1))
+        cancelled = Showtime.objects.create(
+            movie=showtime.movie, screen=showtime.screen, base_price=showtime.base_price,
+            available_seats=4, status=Showtime.ShowStatus.CANCELLED,
+            start_time=showtime.end_time + timedelta(hours=1),
+            end_time=showtime.end_time + timedelta(hours=3))
+        index = IntervalIndex.load([showtime.screen_id], showtime.start_time, cancelled.end_time,
+                                   buffer=timedelta(minutes=15))
+        self.assertEqual(index.find(showtime.screen_id, showtime.start_time, showtime.end_time),
+                         f'showtime {showtime.id}')
+        self.assertIsNone(index.find(showtime.screen_id, cancelled.start_time, cancelled.end_time))
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        added = [f'jti-{i}' for i in range(1000)]
+        for value in added:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in added))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(TOKEN_BLACKLIST_FILTER_CAPACITY=1000, TOKEN_BLACKLIST_SYNC_INTERVAL=60)
+class TokenBlacklistFilterTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(token_blacklist, 'blacklist_filter', BlacklistFilter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            email='tokens@example.com', password='Token-Blacklist-2025', full_name='Tokens')
+
+    def test_blacklisted_token_is_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        with self.assertRaises(TokenError):
+            RefreshToken(str(token))
+
+    def test_unknown_jti_skips_blacklist_query(self):
+        token = str(RefreshToken.for_user(self.user))
+        RefreshToken(token)  # nạp filter lần đầu
+        with self.assertNumQueries(0):
+            RefreshToken(token)
+
+    def test_token_blacklisted_elsewhere_is_seen_after_sync(self):
+        # Giả lập tiến trình khác blacklist token: filter của tiến trình này chưa biết
+        token = RefreshToken.for_user(self.user)
+        RefreshToken(str(token))
+        with mock.patch.object(token_blacklist.BlacklistFilter, 'add'):
+            token.blacklist()
+        token_blacklist.blacklist_filter.synced_at = 0
+        with self.assertRaises(TokenError):
+            RefreshToken(str(token))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_PIN_SECONDS=30)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+
+    def test_only_reads_inside_read_from_replica_use_replica(self):
+        self.assertIsNone(self.router.db_for_read(Movie))
+        with read_from_replica('catalog'):
+            self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+            self.assertEqual(self.router.db_for_write(Movie), 'default')
+        self.assertIsNone(self.router.db_for_read(Movie))
+
+    def test_pinned_scope_reads_primary_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            pin_to_primary('catalog')
+        # Chưa commit thì chưa ghim
+        with read_from_replica('catalog'):
+            self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+        for callback in callbacks:
+            callback()
+        with read_from_replica('catalog'):
+            self.assertIsNone(self.router.db_for_read(Movie))
+        with read_from_replica('seat_layout:1'):
+            self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+
+    def test_request_that_wrote_reads_primary(self):
+        token = _request_state.set(RequestState(user_id=7))
+        self.addCleanup(_request_state.reset, token)
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+            self.router.db_for_write(Movie)
+            self.assertIsNone(self.router.db_for_read(Movie))
+
+    def test_pinned_user_reads_primary(self):
+        cache.set(PIN_KEY.format(scope='user:7'), True, 30)
+        token = _request_state.set(RequestState(user_id=7))
+        self.addCleanup(_request_state.reset, token)
+        with read_from_replica('catalog'):
+            self.assertIsNone(self.router.db_for_read(Movie))
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'ticket_movie'))
+        self.assertIsNone(self.router.allow_migrate('default', 'ticket_movie'))
+
+    def test_catalog_pin_is_set_before_version_bump(self):
+        version = catalog_cache.get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            catalog_cache.bump_catalog_version()
+        pin, bump = callbacks
+        pin()
+        self.assertTrue(cache.get(PIN_KEY.format(scope=catalog_cache.PIN_SCOPE)))
+        self.assertEqual(catalog_cache.get_catalog_version(), version)
+        bump()
+        self.assertNotEqual(catalog_cache.get_catalog_version(), version)
+
+    def test_response_built_across_a_version_bump_is_not_cached(self):
+        version = catalog_cache.get_catalog_version()
+
+        def build():
+            # Admin ghi danh mục trong lúc request đang dựng response
+            cache.incr(catalog_cache.VERSION_KEY)
+            return {'movies': []}
+
+        catalog_cache.cached_json_response('test', {}, build)
+        self.assertIsNone(cache.get(catalog_cache._cache_key(version, 'test', {})))
+        response = catalog_cache.cached_json_response('test', {}, lambda: {'movies': [1]})
+        self.assertEqual(json.loads(response.content), {'movies': [1]})
+        self.assertIsNotNone(cache.get(catalog_cache._cache_key(version + 1, 'test', {})))
+
+
+class SeatPlanTests(TestCase):
+    def test_build_seat_plan(self):
+        plan = build_seat_plan({
+            'rows': 2, 'seats_per_row': 6,
+            'vip': [{'rows': 'A', 'numbers': '2-3'}],
+            'couple': [{'rows': 'B', 'numbers': '1,5'}],
+            'gaps': [{'rows': '*', 'numbers': '4'}],
+        })
+        self.assertEqual(plan, {
+            ('A', 1): 'standard', ('A', 2): 'vip', ('A', 3): 'vip',
+            ('A', 5): 'standard', ('A', 6): 'standard',
+            ('B', 1): 'couple', ('B', 3): 'standard', ('B', 5): 'couple',
+        })
+
+    def test_couple_seat_must_fit_in_row(self):
+        with self.assertRaises(ValueError):
+            build_seat_plan({'rows': 1, 'seats_per_row': 5,
+                             'couple': [{'rows': 'A', 'numbers': '5'}]})
+        screen = create_showtime()[0].screen
+        serializer = ScreenSerializer(screen, data={
+            'layout': {'rows': 1, 'seats_per_row': 3, 'couple': [{'rows': 'A'}]}}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('layout', serializer.errors)
+
+    def test_apply_seat_plan_diffs_and_reconciles(self):
+        user = User.objects.create_user(
+            email='layout@example.com', password='Seat-Layout-2025', full_name='Layout')
+        showtime, seats = create_showtime()
+        first, fourth = seats[0], seats[3]
+        create_booking(user, showtime.id, [first.id])
+        cancel_booking(create_booking(user, showtime.id, [fourth.id]).id, user=user)
+
+        result = apply_seat_plan(showtime.screen, build_seat_plan(
+            {'rows': 1, 'seats_per_row': 3, 'vip': [{'rows': 'A', 'numbers': '1'}]}))
+        self.assertEqual(result, {'created': 0, 'updated': 1, 'removed': 1})
+        # A4 từng có booking nên chỉ bị tắt, không bị xoá
+        fourth.refresh_from_db()
+        self.assertFalse(fourth.is_active)
+        self.assertEqual(Seat.objects.get(id=first.id).type, Seat.SeatType.VIP)
+        showtime.refresh_from_db()
+        showtime.screen.refresh_from_db()
+        self.assertEqual(showtime.screen.capacity, 3)
+        self.assertEqual(showtime.available_seats, 2)
+
+        result = apply_seat_plan(showtime.screen, build_seat_plan({'rows': 2, 'seats_per_row': 4}))
+        self.assertEqual(result, {'created': 4, 'updated': 2, 'removed': 0})
+        fourth.refresh_from_db()
+        self.assertTrue(fourth.is_active)
+        # Ghế mới nhận vị trí sau các ghế cũ để không làm lệch bitmap
+        self.assertEqual(sorted(Seat.objects.filter(row='B').values_list('position', flat=True)),
+                         [4, 5, 6, 7])
+        showtime.refresh_from_db()
+        showtime.screen.refresh_from_db()
+        self.assertEqual(showtime.screen.capacity, 8)
+        self.assertEqual(showtime.available_seats, 7)
+
+
+class SeatLayoutCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.showtime, self.seats = create_showtime()
+        self.screen = self.showtime.screen
+
+    def seat_types(self):
+        return [seat['type'] if seat else None for seat in get_layout(self.screen.id)['grid'][0]]
+
+    def test_seat_edit_invalidates_layout(self):
+        self.assertEqual(self.seat_types(), ['standard'] * 4)
+        # Lần sau chỉ còn truy vấn layout_version
+        with self.assertNumQueries(1):
+            get_layout(self.screen.id)
+
+        seat = self.seats[1]
+        seat.type = Seat.SeatType.VIP
+        seat.save()
+        self.assertEqual(self.seat_types(), ['standard', 'vip', 'standard', 'standard'])
+
+        seat.is_active = False
+        seat.save()
+        self.assertFalse(get_layout(self.screen.id)['grid'][0][1]['is_active'])
+        self.screen.refresh_from_db()
+        self.assertEqual(self.screen.capacity, 3)
+
+        Seat.objects.create(screen=self.screen, row='A', number=5, position=4)
+        self.assertEqual(len(self.seat_types()), 5)
+        seat_map = render_seat_map(self.screen.id, self.showtime.id)
+        self.assertEqual(seat_map['max_number'], 5)
+
+
+class ShowtimeImportTests(TestCase):
+    def setUp(self):
+        self.showtime, _ = create_showtime()
+        start = self.showtime.end_time + timedelta(days=1)
+        rows = [(start, 2), (start + timedelta(hours=1), 2), (start + timedelta(hours=4), 2)]
+        self.file = ''.join(json.dumps({
+            'movie': self.showtime.movie_id, 'screen': self.showtime.screen_id,
+            'start_time': begin.isoformat(), 'end_time': (begin + timedelta(hours=hours)).isoformat(),
+            'base_price': '90000',
+        }) + '\n' for begin, hours in rows).encode()
+
+    def run_import(self, dry_run):
+        return import_showtimes(io.BytesIO(self.file), 'jsonl', chunk_size=1, dry_run=dry_run)
+
+    def test_overlap_across_chunks(self):
+        # Mỗi dòng là 1 khối: dòng 2 chồng giờ dòng 1 ở khối trước
+        dry_run = self.run_import(dry_run=True)
+        self.assertEqual((dry_run.created, dry_run.failed), (2, 1))
+        self.assertEqual(dry_run.errors[0]['line'], 2)
+        self.assertEqual(Showtime.objects.count(), 1)
+
+        result = self.run_import(dry_run=False)
+        self.assertEqual((result.created, result.failed), (2, 1))
+        self.assertEqual([error['line'] for error in result.errors], [2])
+        self.assertEqual(Showtime.objects.count(), 3)
+
+
+class UserDirtyFieldSaveTests(TestCase):
+    def setUp(self):
+        created = User.objects.create_user(
+            email='dirty@example.com', password='Dirty-Fields-2025', full_name='Dirty')
+        self.user = User.objects.get(id=created.id)
+
+    def save_queries(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            self.user.save(**kwargs)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_unchanged_save_issues_no_update(self):
+        self.assertEqual(self.save_queries(), [])
+
+    def test_only_dirty_columns_are_updated(self):
+        self.user.full_name = 'Changed'
+        (sql,) = self.save_queries()
+        self.assertIn('"full_name"', sql)
+        self.assertNotIn('"email"', sql)
+        self.assertNotIn('"password"', sql)
+        self.assertEqual(self.save_queries(), [])
+        self.assertEqual(User.objects.get(id=self.user.id).full_name, 'Changed')
+
+    def test_refresh_from_db_resets_loaded_values(self):
+        User.objects.filter(id=self.user.id).update(phone='0900000000')
+        self.user.refresh_from_db()
+        self.assertEqual(self.save_queries(), [])
+        # Đặt lại giá trị cũ (khác giá trị vừa đọc lại) vẫn phải được ghi
+        self.user.phone = ''
+        self.assertEqual(len(self.save_queries()), 1)
+        self.assertEqual(User.objects.get(id=self.user.id).phone, '')
+
+    def test_refresh_of_some_fields_keeps_other_changes(self):
+        self.user.full_name = 'Unsaved'
+        self.user.refresh_from_db(fields=['phone'])
+        self.save_queries()
+        self.assertEqual(User.objects.get(id=self.user.id).full_name, 'Unsaved')
+
+    def test_explicit_update_fields(self):
+        self.user.full_name = 'Later'
+        self.user.phone = '0911111111'
+        (sql,) = self.save_queries(update_fields=['phone'])
+        self.assertNotIn('"full_name"', sql)
+        stored = User.objects.get(id=self.user.id)
+        self.assertEqual((stored.phone, stored.full_name), ('0911111111', 'Dirty'))
+        # full_name chưa được ghi nên vẫn là trường cần lưu
+        self.assertEqual(self.user.get_dirty_fields(), ['full_name'])
+        self.save_queries()
+        self.assertEqual(User.objects.get(id=self.user.id).full_name, 'Later')
+
+    def test_password_change_is_saved_and_validated(self):
+        self.user.set_password('New-Dirty-Fields-2025')
+        self.save_queries()
+        self.assertTrue(User.objects.get(id=self.user.id).check_password('New-Dirty-Fields-2025'))
+        self.user.set_password('123')
+        with self.assertRaises(ValidationError):
+            self.user.save()
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_user_cache()
+        self.addCleanup(clear_user_cache)
+        self.user = User.objects.create_user(
+            email='jwt@example.com', password='Cached-Jwt-2025', full_name='Jwt')
+        self.token = AccessToken.for_user(self.user)
+        self.authentication = CachedJWTAuthentication()
+
+    def authenticate(self):
+        return self.authentication.get_user(self.token)
+
+    def test_user_is_served_from_cache(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().id, self.user.id)
+
+    def test_stamp_change_reloads_user(self):
+        self.authenticate()
+        # Worker khác khoá tài khoản: DB đổi, bản cache trong tiến trình này thì chưa
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertTrue(self.authenticate().is_active)
+        cache.set(STAMP_KEY.format(user_id=self.user.id), 1, 30)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivation_is_seen_immediately(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_change_revokes_tokens(self):
+        # Các module của simplejwt giữ tham chiếu tới api_settings nên override_settings không đổi được
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = AccessToken.for_user(self.user)
+            self.assertEqual(self.authentication.get_user(token).id, self.user.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.set_password('Changed-Jwt-2025')
+                self.user.save()
+            with self.assertRaises(AuthenticationFailed):
+                self.authentication.get_user(token)
+
+
+class BestPromotionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        promotion_index._index = None
+        self.addCleanup(setattr, promotion_index, '_index', None)
+        now = timezone.now()
+        day = timedelta(days=1)
+        percentage, fixed = Promotion.DiscountType.PERCENTAGE, Promotion.DiscountType.FIXED
+        for code, discount_type, value, extra in [
+            ('PCT10', percentage, '10', {}),
+            ('PCT30MIN', percentage, '30', {'min_order_value': Decimal('200000')}),
+            ('FIX25', fixed, '25000', {}),
+            ('FIX50MIN', fixed, '50000', {'min_order_value': Decimal('150000')}),
+            ('EXPIRED', percentage, '90', {'start_date': now - 3 * day, 'end_date': now - day}),
+            ('FUTURE', fixed, '80000', {'start_date': now + day, 'end_date': now + 3 * day}),
+            ('INACTIVE', percentage, '80', {'is_active': False}),
+            ('USEDUP', fixed, '70000', {'max_uses': 2, 'current_uses': 2}),
+        ]:
+            Promotion.objects.create(**{
+                'code': code, 'name': code, 'discount_type': discount_type,
+                'discount_value': Decimal(value), 'start_date': now - day, 'end_date': now + day,
+                **extra})
+
+    def expected_best(self, order_value):
+        """Cách cũ: truy vấn các mã đang hoạt động ở mỗi request rồi tính từng mã"""
+        eligible = [
+            (compute_discount(promotion, order_value), promotion.code)
+            for promotion in active_promotions()
+            if (promotion.min_order_value is None or order_value >= promotion.min_order_value)
+            and (promotion.max_uses is None or promotion.current_uses < promotion.max_uses)
+        ]
+        return max(eligible, default=None)
+
+    def test_matches_per_request_query(self):
+        for order_value in ('20000', '90000', '150000', '180000', '200000', '400000'):
+            order_value = Decimal(order_value)
+            best = promotion_index.best_promotions(order_value)
+            self.assertEqual((best[0][0], best[0][1].code), self.expected_best(order_value),
+                             order_value)
+            codes = {promotion.code for _, promotion in best}
+            self.assertFalse(codes & {'EXPIRED', 'FUTURE', 'INACTIVE', 'USEDUP'})
+
+    def test_best_promotion_view(self):
+        showtime, seats = create_showtime()
+        response = self.client.post('/app/api/main/promotions/best/', {
+            'showtime_id': showtime.id, 'seats_id': [seat.id for seat in seats[:3]],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        # 270000: PCT30MIN giảm 81000, tốt hơn FIX50MIN và PCT10
+        self.assertEqual(data['promotion']['code'], 'PCT30MIN')
+        self.assertEqual(Decimal(str(data['discount_amount'])), Decimal('81000'))
+        self.assertEqual(Decimal(str(data['final_amount'])), Decimal('189000'))
+
+
+class CatalogListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cities = City.objects.bulk_create([City(name=f'City {i}') for i in range(25)])
+
+    def test_pages_cover_every_row_once(self):
+        # 25 dòng: trang cuối thiếu (10) và trang cuối vừa đủ (5)
+        for page_size, expected_pages in [(10, [10, 10, 5]), (5, [5] * 5)]:
+            url, ids, pages = f'/app/api/main/cities/?page_size={page_size}', [], []
+            while url:
+                data = self.client.get(url).json()
+                pages.append(len(data['results']))
+                ids += [city['id'] for city in data['results']]
+                url = data['next']
+            self.assertEqual(pages, expected_pages)
+            self.assertEqual(ids, sorted(city.id for city in self.cities))
+
+        data = self.client.get('/app/api/main/cities/', {'page_size': 1000}).json()
+        self.assertEqual(len(data['results']), 25)
+        self.assertIsNone(data['next'])
+
+    def test_fields(self):
+        data = self.client.get('/app/api/main/cities/', {'fields': 'name'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'name'})
+
+        response = self.client.get('/app/api/main/cities/', {'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+        response = self.client.get('/app/api/main/movies/', {'fields': 'title,screen__cinema'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ScheduleRangeTests(TestCase):
+    url = '/app/api/main/schedule/'
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, data):
+        return self.client.post(self.url, data, content_type='application/json')
+
+    def test_invalid_params(self):
+        day = timezone.localdate() + timedelta(days=1)
+        for data in [
+            {'date_from': str(day), 'date_to': str(day)},
+            {'cinema_ids': [], 'date_from': str(day), 'date_to': str(day)},
+            {'cinema_ids': ['x'], 'date_from': str(day), 'date_to': str(day)},
+            {'cinema_ids': [1], 'date_from': '20/07/2025', 'date_to': str(day)},
+            {'cinema_ids': [1], 'date_from': str(day), 'date_to': str(day - timedelta(days=1))},
+            {'cinema_ids': [1], 'date_from': str(day), 'date_to': str(day + timedelta(days=14))},
+            {'cinema_ids': list(range(1, 52)), 'date_from': str(day), 'date_to': str(day)},
+        ]:
+            self.assertEqual(self.post(data).status_code, 400, data)
+
+    @skipUnless(connection.vendor == 'postgresql', 'schedule_json uses PostgreSQL JSON functions')
+    def test_grouped_by_movie_screen_and_start_time(self):
+        day = timezone.localdate() + timedelta(days=1)
+        city = City.objects.create(name='Ha Noi')
+        cinemas = [Cinema.objects.create(city=city, name=f'Cinema {i}', address='1 Street')
+                   for i in range(3)]
+        screen_1, screen_2 = (Screen.objects.create(cinema=cinemas[0], name=name, capacity=10)
+                              for name in ('Screen 1', 'Screen 2'))
+        screen_3 = Screen.objects.create(cinema=cinemas[1], name='Screen 3', capacity=10)
+        other_screen = Screen.objects.create(cinema=cinemas[2], name='Other', capacity=10)
+        old_movie = Movie.objects.create(title='Old', duration=120, release_date=day - timedelta(days=30))
+        new_movie = Movie.objects.create(title='New', duration=120, release_date=day - timedelta(days=1))
+
+        def showtime(movie, screen, days, hour, **kwargs):
+            start_time = timezone.make_aware(
+                datetime.combine(day + timedelta(days=days), datetime.min.time())) + timedelta(hours=hour)
+            return Showtime.objects.create(
+                movie=movie, screen=screen, base_price=Decimal('90000'), available_seats=10,
+                start_time=start_time, end_time=start_time + timedelta(hours=2), **kwargs).id
+
+        new_s2 = showtime(new_movie, screen_2, 0, 10)
+        new_s1_late = showtime(new_movie, screen_1, 0, 14)
+        new_s1_early = showtime(new_movie, screen_1, 0, 10)
+        new_s1_next_day = showtime(new_movie, screen_1, 1, 9)
+        old_s3 = showtime(old_movie, screen_3, 0, 12)
+        # Bị loại: suất huỷ, rạp không được hỏi, ngoài khoảng ngày
+        showtime(new_movie, screen_1, 0, 18, status=Showtime.ShowStatus.CANCELLED)
+        showtime(old_movie, other_screen, 0, 12)
+        showtime(old_movie, screen_3, 2, 12)
+
+        response = self.post({'cinema_ids': [cinemas[1].id, cinemas[0].id],
+                              'date_from': str(day), 'date_to': str(day + timedelta(days=1))})
+        self.assertEqual(response.status_code, 200)
+        grouped = [
+            (item['movie']['id'], [
+                (screen['cinema_id'], screen['screen_id'],
+                 [st['showtime_id'] for st in screen['showtimes']])
+                for screen in item['screens']])
+            for item in response.json()
+        ]
+        self.assertEqual(grouped, [
+            (old_movie.id, [(cinemas[1].id, screen_3.id, [old_s3])]),
+            (new_movie.id, [
+                (cinemas[0].id, screen_1.id, [new_s1_early, new_s1_late, new_s1_next_day]),
+                (cinemas[0].id, screen_2.id, [new_s2]),
+            ]),
+        ])
+
+
+class CatalogCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def city_names(self):
+        response = self.client.get('/app/api/main/cities/')
+        self.assertEqual(response.status_code, 200)
+        return [city['name'] for city in response.json()['results']]
+
+    def test_model_save_changes_cached_response(self):
+        city = City.objects.create(name='Ha Noi')
+        self.assertEqual(self.city_names(), ['Ha Noi'])
+
+        # Ghi không qua signal thì vẫn đọc bản cache cũ
+        City.objects.filter(pk=city.pk).update(name='Hue')
+        self.assertEqual(self.city_names(), ['Ha Noi'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            city.name = 'Da Nang'
+            city.save()
+        self.assertEqual(self.city_names(), ['Da Nang'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            City.objects.create(name='Can Tho')
+        self.assertEqual(self.city_names(), ['Da Nang', 'Can Tho'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            city.delete()
+        self.assertEqual(self.city_names(), ['Can Tho'])
+
+
+class TranslationETagTests(SimpleTestCase):
+    def test_if_none_match_returns_304(self):
+        response = self.client.get('/app/api/translate/', {'lang': 'en'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(etag, get_catalog('en').etag)
+        self.assertTrue(response.content)
+
+        response = self.client.get('/app/api/translate/', {'lang': 'en'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+        # ETag của ngôn ngữ khác hoặc bản cũ thì gửi lại toàn bộ
+        response = self.client.get('/app/api/translate/', {'lang': 'vi'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_language(self):
+        response = self.client.get('/app/api/translate/', {'lang': '../en'})
+        self.assertEqual(response.status_code, 404)
+
+
+class SQLProfilerTests(TestCase):
+    def get_response(self, request):
+        # 3 truy vấn cùng dạng, chỉ khác tham số (N+1)
+        for city in City.objects.order_by('id'):
+            list(Cinema.objects.filter(city=city))
+        return HttpResponse('ok')
+
+    @override_settings(SQL_PROFILING=False)
+    def test_disabled_middleware_is_not_used(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            SQLProfilerMiddleware(self.get_response)
+        response = self.client.get('/app/api/main/cities/')
+        self.assertFalse(response.has_header('X-DB-Query-Count'))
+
+    @override_settings(SQL_PROFILING=True, SQL_PROFILING_REPEAT_THRESHOLD=3)
+    def test_enabled_middleware_records_queries(self):
+        City.objects.bulk_create([City(name=f'City {i}') for i in range(3)])
+        middleware = SQLProfilerMiddleware(self.get_response)
+        request = RequestFactory().get('/profiled/')
+        with self.assertLogs('ticket_movie.sql_profiler', 'WARNING') as logs:
+            response = middleware(request)
+        self.assertEqual(response['X-DB-Query-Count'], '4')
+        self.assertEqual(response['X-DB-Repeated-Queries'], '1')
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+        profile = logs.records[0].sql_profile
+        self.assertEqual(profile['path'], '/profiled/')
+        self.assertEqual(profile['query_count'], 4)
+        self.assertEqual(profile['repeated'][0]['count'], 3)
+        self.assertIn('cinemas', profile['repeated'][0]['sql'])
+
+    def test_sql_shape_merges_parameter_lists(self):
+        self.assertEqual(sql_shape('SELECT 1 WHERE id IN (%s)'), sql_shape('SELECT 1 WHERE id IN (%s, %s, %s)'))
+        self.assertEqual(sql_shape('INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+                         sql_shape('INSERT INTO t VALUES (%s, %s), (%s, %s), (%s, %s)'))
+        self.assertNotEqual(sql_shape('SELECT 1 WHERE id = %s'), sql_shape('SELECT 1 WHERE id IN (%s)'))
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """Provider giả lập: /userinfo trả profile Google, /slow trả lời chậm hơn timeout"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        if self.path.startswith('/slow'):
+            time.sleep(self.server.slow_delay)
+        body = json.dumps({'sub': '42', 'email': 'stub@example.com', 'name': 'Stub'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SocialProviderClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+        cls.server.client_ports = []
+        cls.server.slow_delay = 1
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.client_ports.clear()
+        cache.clear()
+        social._local.session = None
+        self.addCleanup(setattr, social._local, 'session', None)
+
+    def providers(self, path):
+        return {'google': {'userinfo_url': self.base_url + path},
+                'facebook': {'userinfo_url': self.base_url + path}}
+
+    def test_session_is_reused_across_logins(self):
+        client = social.get_provider_client('google')
+        with override_settings(SOCIAL_AUTH_PROVIDERS=self.providers('/userinfo')):
+            for token in ('token-1', 'token-2', 'token-3'):
+                self.assertEqual(client.fetch_profile(token)['social_id'], '42')
+            self.assertIs(social.get_session(), social.get_session())
+        # Cùng 1 kết nối keep-alive: mọi request tới từ cùng 1 cổng phía client
+        self.assertEqual(len(self.server.client_ports), 3)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+    def test_cached_profile_skips_provider(self):
+        client = social.get_provider_client('google')
+        with override_settings(SOCIAL_AUTH_PROVIDERS=self.providers('/userinfo')):
+            client.fetch_profile('token-1')
+            client.fetch_profile('token-1')
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_slow_provider_times_out(self):
+        client = social.get_provider_client('google')
+        with override_settings(SOCIAL_AUTH_PROVIDERS=self.providers('/slow'),
+                               SOCIAL_AUTH_TIMEOUT=(1, 0.2)):
+            started = time.monotonic()
+            with self.assertRaises(social.SocialAuthError) as raised:
+                client.fetch_profile('token-slow')
+        self.assertEqual(raised.exception.status, 504)
+        self.assertLess(time.monotonic() - started, self.server.slow_delay)
+
+    def test_client_must_implement_request_and_parse(self):
+        class IncompleteClient(social.ProviderClient):
+            name = 'incomplete'
+
+            def request(self, access_token):
+                return None
+
+        with self.assertRaises(TypeError):
+            IncompleteClient()
+
+
+class SocialUserRaceTests(TestCase):
+    def test_concurrent_first_login_reuses_created_user(self):
+        existing = User.objects.create_social_user(
+            'google', '42', email='race@example.com', full_name='First')
+        # Request khác tạo user giữa lúc tra cứu và insert: lần tra đầu không thấy user
+        lookups = [User.objects.none(), User.objects.filter(username='google_42')]
+        with mock.patch.object(User.objects, 'filter', side_effect=lookups):
+            user = User.objects.create_social_user(
+                'google', '42', email='race@example.com', full_name='Second')
+        self.assertEqual(user.pk, existing.pk)
+        self.assertEqual(user.full_name, 'Second')
+        self.assertEqual(User.objects.filter(username='google_42').count(), 1)
+
+    def test_clean_keeps_missing_social_email_as_none(self):
+        user = User.objects.create_social_user('facebook', '7', full_name='No Email')
+        user.full_clean()
+        self.assertIsNone(user.email)
+        user.email = 'Mixed@EXAMPLE.com'
+        user.clean()
+        self.assertEqual(user.email, 'Mixed@example.com')
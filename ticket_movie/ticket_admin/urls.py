@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import CinemaView, MovieView, ScreenView, ShowtimeView
+from .views import CinemaView, MovieView, ScreenView, ShowtimeImportView, ShowtimeView
 
 urlpatterns = [
     path('cinema/create/', CinemaView.as_view(), name='create_cinema'),
@@ -14,4 +14,5 @@ urlpatterns = [
     path('showtime/create/', ShowtimeView.as_view(), name='create_showtime'),
     path('showtime/update/<int:id>/', ShowtimeView.as_view(), name='update_showtime'),
     path('showtime/delete/<int:id>/', ShowtimeView.as_view(), name='delete_showtime'),
+    path('showtime/import/', ShowtimeImportView.as_view(), name='import_showtimes'),
 ]
@@ -2,8 +2,10 @@ from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from ticket_movie.app.serializers import CinemaSerializer, MovieSerializer, ScreenSerializer, ShowtimeSerializer
 from ticket_movie.models import Booking, BookingSeat, Cinema, City, Movie, Screen, Seat, Showtime, User
+from ticket_movie.showtime_import import FORMATS, guess_format, import_showtimes
 
 class CinemaView(APIView):
     def post(self, request):
@@ -154,7 +156,9 @@ class ShowtimeView(APIView):
                         'message': "Showtime update successfully"
                     }, status=status.HTTP_201_CREATED)
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-                
+
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except:
             return Response({'message': 'Update error'})
         
@@ -170,4 +174,21 @@ class ShowtimeView(APIView):
                 }, status=status.HTTP_201_CREATED)
                 
         except:
-            return Response({'message': 'Delete error'})
\ No newline at end of file
+            return Response({'message': 'Delete error'})
+
+class ShowtimeImportView(APIView):
+    """Nhập nhiều suất chiếu từ file CSV/JSON Lines (trường 'file', tuỳ chọn 'format', 'dry_run')"""
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'message': 'Please upload a CSV or JSON Lines file'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or guess_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({'message': f"Unsupported format, use one of: {', '.join(FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        result = import_showtimes(upload.open('rb'), fmt, dry_run=dry_run)
+        return Response(result.report(), status=status.HTTP_200_OK)
@@ -0,0 +1,127 @@
+"""
+Blacklist refresh token có dọn dẹp theo hạn và bộ lọc Bloom trong tiến trình.
+
+Bloom filter chứa jti của mọi token đã bị blacklist: jti không có trong filter
+chắc chắn chưa bị blacklist nên RefreshToken bỏ qua truy vấn DB, còn khi filter
+báo "có thể có" thì vẫn hỏi DB như cũ. Filter nạp thêm các token mới bị
+blacklist (theo blacklisted_at) tối đa mỗi TOKEN_BLACKLIST_SYNC_INTERVAL giây;
+token bị blacklist ở tiến trình hiện tại được thêm ngay, ở tiến trình khác thì
+có hiệu lực sau tối đa khoảng đó. Filter được dựng lại toàn bộ sau
+TOKEN_BLACKLIST_REBUILD_INTERVAL giây để bỏ các jti đã bị prune_tokens xoá.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: k vị trí từ 2 giá trị băm 64 bit của blake2b
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+
+class BlacklistFilter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self.synced_until = None
+
+    def load(self, bloom, since=None):
+        rows = BlacklistedToken.objects.all()
+        if since is not None:
+            rows = rows.filter(blacklisted_at__gte=since)
+        for jti in rows.values_list('token__jti', flat=True).iterator(chunk_size=5000):
+            bloom.add(jti)
+
+    def sync(self):
+        now = time.monotonic()
+        if now - self.synced_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+            return
+        # Chỉ 1 luồng nạp dữ liệu, các luồng khác dùng tạm filter hiện có
+        if not self.lock.acquire(blocking=self.filter is None):
+            return
+        try:
+            if now - self.synced_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+                return
+            started = timezone.now()
+            if self.filter is None or now - self.built_at > settings.TOKEN_BLACKLIST_REBUILD_INTERVAL:
+                bloom = BloomFilter(settings.TOKEN_BLACKLIST_FILTER_CAPACITY)
+                self.load(bloom)
+                self.filter = bloom
+                self.built_at = now
+            else:
+                # Đọc lùi SYNC_OVERLAP giây để không sót token được ghi trong lúc nạp lần trước
+                self.load(self.filter, self.synced_until - settings.TOKEN_BLACKLIST_SYNC_OVERLAP)
+            self.synced_until = started
+            self.synced_at = now
+        finally:
+            self.lock.release()
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.filter
+
+    def add(self, jti):
+        if self.filter is not None:
+            self.filter.add(jti)
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """RefreshToken chỉ hỏi bảng blacklist khi Bloom filter không loại trừ được jti"""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+
+def prune_expired_tokens(batch_size=None, now=None):
+    """
+    Xoá tối đa batch_size outstanding token đã hết hạn (blacklisted token đi
+    kèm bị xoá theo CASCADE). Trả về số token đã xoá.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = now or timezone.now()
+    with transaction.atomic():
+        token_ids = list(
+            OutstandingToken.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        BlacklistedToken.objects.filter(token_id__in=token_ids).delete()
+        OutstandingToken.objects.filter(id__in=token_ids).delete()
+    return len(token_ids)
@@ -2,7 +2,6 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from .serializers import (
     UserCreateSerializer,
@@ -14,9 +13,11 @@ from .serializers import (
     SocialLoginSerializer
 )
 
-import requests, os, polib
+import os, polib
 from .models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+# RefreshToken có Bloom filter cho blacklist, tránh truy vấn DB ở mỗi lần refresh
+from .token_blacklist import RefreshToken
+from .social import SocialAuthError, get_provider_client
 
 
 class RegisterView(APIView):
@@ -104,7 +105,7 @@ class ChangePasswordView(APIView):
         user = request.user
         new_password = serializer.validated_data['new_password']
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=['password'])
 
         return Response(
             {'message': 'Mật khẩu đã được cập nhật thành công'},
@@ -168,47 +169,20 @@ class SocialLoginView(APIView):
         provider = serializer.validated_data['provider']
         access_token = serializer.validated_data['access_token']
 
-        if provider == 'google':
-            user_info_url = 'https://www.googleapis.com/oauth2/v3/userinfo'
-            headers = {'Authorization': f'Bearer {access_token}'}
-            resp = requests.get(user_info_url, headers=headers)
-            if resp.status_code != 200:
-                return Response({'error': 'Invalid Google token'}, status=400)
-            data = resp.json()
-            email = data.get('email')
-            social_id = data.get('sub')
-            avatar = data.get('picture')
-            full_name = data.get('name')
-        elif provider == 'facebook':
-            user_info_url = f'https://graph.facebook.com/me?fields=id,name,email,picture&access_token={access_token}'
-            resp = requests.get(user_info_url)
-            if resp.status_code != 200:
-                return Response({'error': 'Invalid Facebook token'}, status=400)
-            data = resp.json()
-            email = data.get('email')
-            social_id = data.get('id')
-            avatar = data.get('picture', {}).get('data', {}).get('url')
-            full_name = data.get('name')
-        else:
-            return Response({'error': 'Provider not supported'}, status=400)
-
         try:
-            user = User.objects.get(provider=provider, social_id=social_id)
-            # Cập nhật thông tin nếu cần
-            user.email = email or user.email
-            user.full_name = full_name or user.full_name
-            user.avatar = avatar or user.avatar
-            user.save()
-        except User.DoesNotExist:
-            user = User.objects.create_social_user(
-                provider=provider,
-                social_id=social_id,
-                email=email,
-                full_name=full_name,
-                avatar=avatar,
-                is_active=True,
-                username=f'{provider}_{social_id}',
-            )
+            profile = get_provider_client(provider).fetch_profile(access_token)
+        except SocialAuthError as e:
+            return Response({'error': str(e)}, status=e.status)
+
+        # Tạo mới hoặc cập nhật thông tin user từ provider
+        user = User.objects.create_social_user(
+            provider=provider,
+            social_id=profile['social_id'],
+            email=profile['email'],
+            full_name=profile['full_name'] or '',
+            avatar=profile['avatar'],
+            is_active=True,
+        )
 
         refresh = RefreshToken.for_user(user)
         return Response({